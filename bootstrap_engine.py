@@ -0,0 +1,80 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+#############################################################
+
+# Bootstrap engine section #
+
+# Bootstrap confidence intervals on the correlation and OLS slope of one indicator pair. Each chunk of resamples is
+# drawn as a single (resamples, countries) index matrix and reduced with array operations, so thousands of resamples
+# take milliseconds. Chunks have a fixed size and their own seed spawned from the caller's seed, which makes the
+# result identical whether the chunks run in this process or spread over a process pool.
+
+DEFAULT_RESAMPLES = 4000
+CHUNK_SIZE = 500
+
+
+def resample_statistics(x, y, resamples, seed):
+    """Correlation and slope of ``resamples`` bootstrap samples of the paired observations ``x``, ``y``."""
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(x), size=(resamples, len(x)))
+    xs = x[index]
+    ys = y[index]
+
+    dx = xs - xs.mean(axis=1, keepdims=True)
+    dy = ys - ys.mean(axis=1, keepdims=True)
+    sxx = (dx * dx).sum(axis=1)
+    syy = (dy * dy).sum(axis=1)
+    sxy = (dx * dy).sum(axis=1)
+
+    # A resample made of a single repeated country has no spread and yields NaN, which the percentiles skip
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sxy / np.sqrt(sxx * syy), sxy / sxx
+
+
+def _resample_chunk(args):
+    return resample_statistics(*args)
+
+
+def bootstrap_intervals(x, y, resamples=DEFAULT_RESAMPLES, seed=0, level=0.95, executor=None):
+    """Percentile bootstrap intervals for the correlation and slope of ``y`` on ``x``.
+
+    ``executor`` is an optional ``concurrent.futures`` executor (e.g. a ProcessPoolExecutor) to spread the chunks
+    over; without one everything runs in the calling process.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    sizes = [CHUNK_SIZE] * (resamples // CHUNK_SIZE) + ([resamples % CHUNK_SIZE] if resamples % CHUNK_SIZE else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(x, y, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    results = list(executor.map(_resample_chunk, chunks) if executor is not None else map(_resample_chunk, chunks))
+    correlations = np.concatenate([correlation for correlation, _ in results])
+    slopes = np.concatenate([slope for _, slope in results])
+
+    tail = (1 - level) / 2 * 100
+    correlation_low, correlation_high = np.nanpercentile(correlations, [tail, 100 - tail])
+    slope_low, slope_high = np.nanpercentile(slopes, [tail, 100 - tail])
+
+    return {
+        'n': len(x),
+        'resamples': resamples,
+        'pearson_low': float(correlation_low),
+        'pearson_high': float(correlation_high),
+        'slope_low': float(slope_low),
+        'slope_high': float(slope_high)
+    }
+
+
+def process_pool(workers):
+    """A process pool for ``bootstrap_intervals``, or None to stay in-process when ``workers`` is 0.
+
+    Workers are spawned, not forked: forking a multi-threaded server worker can copy a lock held by another thread
+    and deadlock the child.
+    """
+    if not workers:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
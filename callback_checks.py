@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import plotly.io as pio
+
+from dashboard_data import country_list
+
+#############################################################
+
+# Callback checks section #
+
+# Regression and performance-budget checks for the dashboard callbacks. Every valid input of the pie, scatter plot
+# and line-chart callbacks (every country of the dropdown, every lifestyle factor) plus unknown and missing countries
+# is run against the imported app, and for one country the line charts of every sub-group, every obesity survey type,
+# the comparison sets (every country, an explicit list, the cross-filter selection):
+#   - each output is compared with its golden snapshot in SNAPSHOT_FILE (a digest of the figure JSON, and a short
+#     summary of it so a failure says what changed);
+#   - the 95th percentile latency and the peak allocated memory of each callback must stay within BUDGETS. The
+#     result caches behind the callbacks (`result_caches`) are cleared before every measured call, so the budgets
+#     hold for a first request rather than for a cache hit.
+# `python callback_checks.py` exits non-zero when anything fails; `--update` rewrites the snapshots after an intended
+# change of the figures. Budgets are for one core of a current machine; `--budget-scale` loosens them on slower ones.
+
+SNAPSHOT_FILE = os.path.join('snapshots', 'callbacks.json')
+
+# 95th percentile latency (ms) and peak memory allocated during one call (KB), per callback
+BUDGETS = {
+    'update_pies': {'latency_ms': 400, 'memory_kb': 4096},
+    'update_scatter_plot': {'latency_ms': 150, 'memory_kb': 4096},
+    'update_line_charts': {'latency_ms': 250, 'memory_kb': 4096}
+}
+
+UNKNOWN_COUNTRIES = ['XXX', '', None]
+
+# Comparison keys of the line charts besides none: every country, and explicit lists ('{}' is the checked country)
+COMPARISON_SETS = ['*', '{}.DEU.FRA.USA', 'XXX.{}']
+
+# Calls per case for the latency measurement; the median of them is the case's latency
+REPEATS = 3
+
+
+def callback_cases(dashboard):
+    """(callback name, case name, arguments) of every checked call."""
+    factors = list(dashboard.scatter_indicator_codes)
+    countries = country_list + UNKNOWN_COUNTRIES
+    cases = []
+
+    for country in countries:
+        cases.append(('update_pies', 'pies {}'.format(country), (country,)))
+
+    for factor in factors + ['Unknown factor', None]:
+        cases.append(('update_scatter_plot', 'scatter {}'.format(factor), (factor, None)))
+
+    for country in countries:
+        for factor in factors:
+            cases.append(('update_line_charts', 'lines {} {}'.format(country, factor),
+                          (country, factor, 'TOT', '', [], 'PREFERRED', None)))
+
+    # The variants below are checked for one country; they change which panel rows and locations are drawn, not how
+    country = country_list[0]
+    for factor in factors:
+        for option in dashboard.subject_options(factor)[1:]:
+            cases.append(('update_line_charts', 'lines {} {} subject {}'.format(country, factor, option['value']),
+                          (country, factor, option['value'], '', [], 'PREFERRED', None)))
+
+        for option in dashboard.obesity_subject_options[1:]:
+            cases.append(('update_line_charts', 'lines {} {} obesity {}'.format(country, factor, option['value']),
+                          (country, factor, 'TOT', '', [], option['value'], None)))
+
+        for comparison_set in COMPARISON_SETS:
+            comparison_set = comparison_set.format(country)
+            cases.append(('update_line_charts', 'lines {} {} compare {}'.format(country, factor, comparison_set),
+                          (country, factor, 'TOT', comparison_set, [], 'PREFERRED', None)))
+
+        selected = country_list[1:4]
+        cases.append(('update_line_charts', 'lines {} {} selected {}'.format(country, factor, '.'.join(selected)),
+                      (country, factor, 'TOT', '', selected, 'PREFERRED', None)))
+
+    return cases
+
+
+def _figures(output):
+    return list(output) if isinstance(output, (list, tuple)) else [output]
+
+
+def snapshot(output):
+    """Digest and summary of a callback output (one figure or a tuple of them)."""
+    figures = [json.loads(pio.to_json(fig, validate=False)) for fig in _figures(output)]
+    canonical = json.dumps(figures, sort_keys=True, separators=(',', ':'))
+
+    summary = []
+    for fig in figures:
+        layout = fig.get('layout', {})
+        summary.append({
+            'title': (layout.get('title') or {}).get('text'),
+            'traces': [trace.get('type', 'scatter') for trace in fig.get('data', [])],
+            'annotations': [annotation.get('text') for annotation in layout.get('annotations', [])]
+        })
+
+    return {'digest': hashlib.sha256(canonical.encode()).hexdigest(), 'summary': summary}
+
+
+def result_caches(dashboard):
+    """The lru_caches in front of the figure and query work of the checked callbacks."""
+    return [dashboard.comparison_line_charts, dashboard.pair_bootstrap, dashboard.indicator_store.latest_values,
+            dashboard.indicator_store.latest_value]
+
+
+def measure(func, args, caches=()):
+    def clear():
+        for cache in caches:
+            cache.cache_clear()
+
+    latencies = []
+    for _ in range(REPEATS):
+        clear()
+        started = time.perf_counter()
+        output = func(*args)
+        latencies.append(time.perf_counter() - started)
+
+    clear()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return output, float(np.median(latencies)) * 1000, peak / 1024
+
+
+def run_checks(update=False, budget_scale=1.0):
+    """Run every case; return the list of failure messages (empty when everything passed)."""
+    import main as dashboard
+    dashboard.warm_up()
+
+    try:
+        with open(SNAPSHOT_FILE) as file:
+            golden = json.load(file)
+    except FileNotFoundError:
+        golden = {}
+
+    caches = result_caches(dashboard)
+    failures = []
+    snapshots = {}
+    latencies = {name: [] for name in BUDGETS}
+    peaks = {name: [] for name in BUDGETS}
+
+    for callback_name, case, args in callback_cases(dashboard):
+        try:
+            output, latency, peak = measure(getattr(dashboard, callback_name), args, caches)
+        except Exception as error:
+            failures.append('{}: raised {!r}'.format(case, error))
+            continue
+
+        latencies[callback_name].append(latency)
+        peaks[callback_name].append(peak)
+        snapshots[case] = snapshot(output)
+
+        if update:
+            continue
+        if case not in golden:
+            failures.append('{}: no snapshot (run with --update)'.format(case))
+        elif snapshots[case]['digest'] != golden[case]['digest']:
+            changed = snapshots[case]['summary'] != golden[case]['summary']
+            failures.append('{}: figure changed{}'.format(
+                case, ', was {} now {}'.format(golden[case]['summary'], snapshots[case]['summary']) if changed
+                else ' (same titles, traces and annotations; values differ)'))
+
+    for callback_name, budget in BUDGETS.items():
+        if not latencies[callback_name]:
+            continue
+        p95 = float(np.percentile(latencies[callback_name], 95))
+        peak = max(peaks[callback_name])
+        print('{:<22} {:>4} cases  p95 {:7.1f} ms (budget {:5.0f})  peak {:7.0f} KB (budget {:5.0f})'.format(
+            callback_name, len(latencies[callback_name]), p95, budget['latency_ms'] * budget_scale, peak,
+            budget['memory_kb'] * budget_scale))
+
+        if p95 > budget['latency_ms'] * budget_scale:
+            failures.append('{}: p95 latency {:.1f} ms over budget'.format(callback_name, p95))
+        if peak > budget['memory_kb'] * budget_scale:
+            failures.append('{}: peak memory {:.0f} KB over budget'.format(callback_name, peak))
+
+    if update:
+        os.makedirs(os.path.dirname(SNAPSHOT_FILE), exist_ok=True)
+        with open(SNAPSHOT_FILE, 'w') as file:
+            json.dump(snapshots, file, indent=1, sort_keys=True)
+        print('Wrote {} snapshots to {}'.format(len(snapshots), SNAPSHOT_FILE))
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the dashboard callbacks against golden snapshots and '
+                                                 'performance budgets.')
+    parser.add_argument('--update', action='store_true', help='rewrite the golden snapshots instead of comparing')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='multiply every latency and memory budget, e.g. 2 on a slow machine')
+    options = parser.parse_args()
+
+    failures = run_checks(options.update, options.budget_scale)
+    for failure in failures:
+        print('FAIL', failure)
+    print('{} failure(s)'.format(len(failures)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,144 @@
+import numpy as np
+
+#############################################################
+
+# Correlation engine section #
+
+# Computes correlations and OLS trend lines for every ordered indicator pair and every year of an
+# (indicator, year, country) panel in one vectorised pass. All results are arrays indexed (x indicator, y indicator,
+# year), so the scatter overlay and the correlation matrix only look values up.
+# Each (pair, year) uses the countries where both indicators are present; fewer than MIN_COUNTRIES gives NaN.
+
+MIN_COUNTRIES = 3
+TREND_POINTS = 50
+
+# Two-sided 95% normal quantile
+_Z = 1.959963984540054
+
+
+# Exact two-sided 95% t quantiles for the degrees of freedom the expansion below does not cover
+_T_SMALL_DF = {1: 12.706204736174698, 2: 4.302652729749464, 3: 3.182446305284263, 4: 2.7764451051977987}
+
+
+def t_quantile(df):
+    """Two-sided 95% Student t quantile: exact for df 1 to 4, Cornish-Fisher expansion (~1e-3) from df 5 on."""
+    df = np.asarray(df, dtype='float64')
+    z = _Z
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quantile = (z
+                    + (z ** 3 + z) / (4 * df)
+                    + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+                    + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+                    + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4))
+
+    for small_df, exact in _T_SMALL_DF.items():
+        quantile = np.where(df == small_df, exact, quantile)
+    return quantile
+
+
+def average_ranks(values, valid):
+    """Rank ``values`` along the last axis among the ``valid`` entries, giving ties their average rank."""
+    size = values.shape[-1]
+    filled = np.where(valid, values, np.inf)
+
+    order = np.argsort(filled, axis=-1, kind='stable')
+    ordered = np.take_along_axis(filled, order, axis=-1)
+    position = np.arange(1, size + 1)
+
+    # A tie group spans from its first to its last position in sorted order
+    starts = np.ones(ordered.shape, dtype=bool)
+    starts[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+    ends = np.ones(ordered.shape, dtype=bool)
+    ends[..., :-1] = starts[..., 1:]
+
+    group_start = np.maximum.accumulate(np.where(starts, position, 0), axis=-1)
+    group_end = np.flip(np.minimum.accumulate(np.flip(np.where(ends, position, size + 1), axis=-1), axis=-1), axis=-1)
+
+    ranks = np.empty(ordered.shape, dtype='float64')
+    np.put_along_axis(ranks, order, (group_start + group_end) / 2, axis=-1)
+
+    return np.where(valid, ranks, np.nan)
+
+
+def _pearson(x, y, valid, n):
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    safe_n = np.maximum(n, 1)
+
+    x_mean = x.sum(-1) / safe_n
+    y_mean = y.sum(-1) / safe_n
+    dx = np.where(valid, x - x_mean[..., None], 0.0)
+    dy = np.where(valid, y - y_mean[..., None], 0.0)
+
+    sxx = (dx * dx).sum(-1)
+    syy = (dy * dy).sum(-1)
+    sxy = (dx * dy).sum(-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = sxy / np.sqrt(sxx * syy)
+
+    return r, x_mean, y_mean, sxx, syy, sxy
+
+
+def pairwise_statistics(panel):
+    """Correlations, trend lines and 95% intervals for every (x indicator, y indicator, year) of ``panel``.
+
+    Returns a dict of arrays indexed (x, y, year) — ``n``, ``pearson``, ``pearson_low``/``pearson_high`` (Fisher z
+    interval), ``spearman``, ``slope``, ``intercept``, ``slope_low``/``slope_high`` — plus the trend line itself
+    indexed (x, y, year, point): ``trend_x``, ``trend_y`` and the confidence band ``trend_low``/``trend_high``.
+    """
+    panel = panel.astype('float64')
+    x = panel[:, None]
+    y = panel[None, :]
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    n = valid.sum(-1)
+    enough = n >= MIN_COUNTRIES
+
+    r, x_mean, y_mean, sxx, syy, sxy = _pearson(x, y, valid, n)
+    spearman = _pearson(average_ranks(x, valid), average_ranks(y, valid), valid, n)[0]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Fisher z interval for the correlation
+        fisher_z = np.arctanh(np.clip(r, -0.999999, 0.999999))
+        fisher_se = 1 / np.sqrt(n - 3)
+        pearson_low = np.tanh(fisher_z - _Z * fisher_se)
+        pearson_high = np.tanh(fisher_z + _Z * fisher_se)
+
+        # OLS of y on x with the usual t interval on the slope
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+        residual_var = np.maximum(syy - slope * sxy, 0) / (n - 2)
+        t = t_quantile(n - 2)
+        slope_se = np.sqrt(residual_var / sxx)
+
+        # Trend line and confidence band of the mean response over each pair's observed x range
+        x_low = np.where(valid, x, np.inf).min(-1)
+        x_high = np.where(valid, x, -np.inf).max(-1)
+        steps = np.linspace(0, 1, TREND_POINTS)
+        trend_x = x_low[..., None] + (x_high - x_low)[..., None] * steps
+        trend_y = intercept[..., None] + slope[..., None] * trend_x
+        band = t[..., None] * np.sqrt(
+            residual_var[..., None] * (1 / n[..., None] + (trend_x - x_mean[..., None]) ** 2 / sxx[..., None]))
+
+    statistics = {
+        'n': n,
+        'pearson': r,
+        'pearson_low': pearson_low,
+        'pearson_high': pearson_high,
+        'spearman': spearman,
+        'slope': slope,
+        'intercept': intercept,
+        'slope_low': slope - t * slope_se,
+        'slope_high': slope + t * slope_se,
+        'trend_x': trend_x,
+        'trend_y': trend_y,
+        'trend_low': trend_y - band,
+        'trend_high': trend_y + band
+    }
+
+    for name, values in statistics.items():
+        if name != 'n':
+            mask = enough if values.ndim == enough.ndim else enough[..., None]
+            statistics[name] = np.where(mask, values, np.nan)
+
+    return statistics
@@ -0,0 +1,227 @@
+import multiprocessing
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from bootstrap_engine import bootstrap_intervals, process_pool
+from correlation_engine import pairwise_statistics
+from data_validation import log_report, read_indicator_csv, validate_datasets
+from health import expect_datasets, mark_done, record_dataset
+from indicator_panel import build_panel, carry_forward, interpolate_gaps
+from indicator_store import open_store
+
+#############################################################
+
+# Data Processing section #
+
+# The data core of the dashboard: the OECD datasets, the indicator store, the indicator panels and the statistics
+# computed from them. Loaded once per process on first import and shared by the app and its pages (main), the report
+# export and the callback checks; nothing here depends on Dash.
+
+DATASET_NAMES = ['obesity', 'alcohol', 'smoke', 'social_support',
+                 'obesity_full', 'alcohol_full', 'smoke_full', 'social_support_full']
+expect_datasets(DATASET_NAMES)
+
+
+def load_dataset(name, path):
+    # Row count, memory, load time and file mtime of every dataset are reported by /healthz and /readyz
+    started = time.perf_counter()
+    df = read_indicator_csv(path)
+    record_dataset(name, path, df, time.perf_counter() - started)
+    return df
+
+
+# transform obesity dataset
+obesity_df = load_dataset('obesity', "obesity_by_country.csv")
+obesity_mean_df = obesity_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
+obesity_maxyear_df = obesity_mean_df.loc[obesity_mean_df.groupby('LOCATION')['TIME'].idxmax()]
+obesity_sorted_by_value_df = obesity_maxyear_df.sort_values(by="Value")
+
+# transform alcohol dataset
+alcohol_df = load_dataset('alcohol', "alcohol_by_country.csv")
+alcohol_remove_col_df = alcohol_df[['LOCATION', 'TIME', 'Value']]
+alcohol_maxyear_df = alcohol_remove_col_df.loc[alcohol_remove_col_df.groupby('LOCATION')['TIME'].idxmax()].sort_index()
+alcohol_sorted_by_value_df = alcohol_maxyear_df.sort_values(by="Value")
+
+# transform smoke dataset
+smoke_df = load_dataset('smoke', "smoke_by_country.csv")
+smoke_remove_col_df = smoke_df[['LOCATION', 'TIME', 'Value']]
+smoke_maxyear_df = smoke_remove_col_df.loc[smoke_remove_col_df.groupby('LOCATION')['TIME'].idxmax()].sort_index()
+smoke_sorted_by_value_df = smoke_maxyear_df.sort_values(by="Value")
+
+# transform social support dataset
+social_support_df = load_dataset('social_support', "socialsupport_by_country.csv")
+social_support_remove_col_df = social_support_df[['LOCATION', 'TIME', 'Value']]
+social_support_maxyear_df = social_support_remove_col_df.loc[
+    social_support_remove_col_df.groupby('LOCATION')['TIME'].idxmax()].sort_index()
+social_support_sorted_by_value_df = social_support_maxyear_df.sort_values(by="Value")
+
+# country list
+country_df = obesity_sorted_by_value_df[['LOCATION']]
+country_list = country_df['LOCATION'].tolist()
+
+# Data filtered by country (For line chart part)
+obesity_full_df = load_dataset('obesity_full', "obesity_by_country_full.csv")
+obesity_mean_full_df = obesity_full_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
+
+# Obesity surveys are either MEASURED or SELFREPORTED; keep them apart instead of averaging the two
+obesity_subject_mean_full_df = obesity_full_df.groupby(['SUBJECT', 'LOCATION', 'TIME'])['Value'].mean().reset_index()
+obesity_measured_full_df = obesity_subject_mean_full_df[obesity_subject_mean_full_df['SUBJECT'] == 'MEASURED']
+obesity_selfreported_full_df = obesity_subject_mean_full_df[obesity_subject_mean_full_df['SUBJECT'] == 'SELFREPORTED']
+
+# Preferred series: per country and year the measured value where there is one, else the self-reported one, so a
+# single measured year does not hide a country's self-reported history
+measured_years = pd.MultiIndex.from_frame(obesity_measured_full_df[['LOCATION', 'TIME']])
+mask = pd.MultiIndex.from_frame(obesity_selfreported_full_df[['LOCATION', 'TIME']]).isin(measured_years)
+obesity_preferred_full_df = pd.concat([obesity_measured_full_df, obesity_selfreported_full_df[~mask]])
+
+alcohol_full_df = load_dataset('alcohol_full', "alcohol_by_country_full.csv")
+alcohol_mean_full_df = alcohol_full_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
+
+smoke_full_df = load_dataset('smoke_full', "smoke_by_country_full.csv")
+smoke_mean_full_df = smoke_full_df[smoke_full_df['SUBJECT'] == 'TOT'].groupby(['LOCATION', 'TIME'])[
+    'Value'].mean().reset_index()
+
+social_support_full_df = load_dataset('social_support_full', "socialsupport_by_country_full.csv")
+social_support_mean_full_df = social_support_full_df[social_support_full_df['SUBJECT'] == 'TOT'].groupby(
+    ['LOCATION', 'TIME'])['Value'].mean().reset_index()
+
+# Latest-value lookups of the pie charts and scatter plot, over every dataset loaded above
+indicator_store = open_store({
+    'summary': [obesity_df, alcohol_df, smoke_df, social_support_df],
+    'full': [obesity_full_df, alcohol_full_df, smoke_full_df, social_support_full_df]
+})
+
+# merge obesity and alcohol dataset (in the store's row order, which the scatter plot callback uses too)
+merged_df = indicator_store.latest_pair('OVEROBESE', 'ALCOHOL')
+merged_df = merged_df.rename(columns={'Value_x': 'Obesity_value', 'Value_y': 'Alcohol_value'})
+
+# Every SUBJECT breakdown of the lifestyle factors (sex, age group, education level), for the sub-group drill-down
+factor_subject_mean_full_dfs = {
+    name: df.groupby(['SUBJECT', 'LOCATION', 'TIME'])['Value'].mean().reset_index()
+    for name, df in [('Alcohol Consumption', alcohol_full_df), ('Daily Smokers', smoke_full_df),
+                     ('Social Support', social_support_full_df)]
+}
+
+# Validate every dataset in one pass; `data_report['coverage']` shows which countries have which indicators
+data_report = validate_datasets({
+    'obesity': obesity_df,
+    'alcohol': alcohol_df,
+    'smoke': smoke_df,
+    'social_support': social_support_df,
+    'obesity_full': obesity_full_df,
+    'alcohol_full': alcohol_full_df,
+    'smoke_full': smoke_full_df,
+    'social_support_full': social_support_full_df
+})
+log_report(data_report)
+
+mark_done('data')
+
+#############################################################
+
+# Indicator panels section #
+
+# All indicators are aligned on one annual grid as a dense (indicator, year, country) panel. Years between two
+# observations are linearly interpolated and flagged in `imputed_panel`, so views only ever slice arrays.
+# The map carries the aligned values forward so each year shows the latest value known at that point; the map keeps
+# one trace over a fixed list of locations so switching the indicator or the year only swaps `z`.
+# Values are float32 arrays sent as plotly.js typed arrays (base64 `bdata`) instead of JSON number lists.
+map_indicators = {
+    'Obesity': {'df': obesity_preferred_full_df, 'label': 'Obese<br>(population %)'},
+    'Alcohol Consumption': {'df': alcohol_mean_full_df, 'label': 'Alcohol<br>(Litre/Capita)'},
+    'Daily Smokers': {'df': smoke_mean_full_df, 'label': 'Daily Smokers<br>(population %)'},
+    'Social Support': {'df': social_support_mean_full_df, 'label': 'Social Support<br>(population %)'}
+}
+
+# Obesity gets one extra row per survey method, plus the averaged series the summary datasets use
+panel_frames = {name: indicator['df'] for name, indicator in map_indicators.items()}
+panel_frames['Obesity MEASURED'] = obesity_measured_full_df
+panel_frames['Obesity SELFREPORTED'] = obesity_selfreported_full_df
+panel_frames['Obesity averaged'] = obesity_mean_full_df
+
+# and every lifestyle factor one row per sub-group (SUBJECT) besides the total, so the sub-group cube
+# (indicator, SUBJECT, year, country) is part of the panel and any drill-down slice is a row lookup
+for name, df in factor_subject_mean_full_dfs.items():
+    for subject, subject_df in df[df['SUBJECT'] != 'TOT'].groupby('SUBJECT'):
+        panel_frames[name + ' ' + subject] = subject_df
+
+panel_rows = {name: i for i, name in enumerate(panel_frames)}
+
+obesity_subject_rows = {
+    'PREFERRED': panel_rows['Obesity'],
+    'MEASURED': panel_rows['Obesity MEASURED'],
+    'SELFREPORTED': panel_rows['Obesity SELFREPORTED']
+}
+
+factor_subject_rows = {
+    name: {subject: panel_rows[name if subject == 'TOT' else name + ' ' + subject]
+           for subject in df['SUBJECT'].unique()}
+    for name, df in factor_subject_mean_full_dfs.items()
+}
+
+map_locations = sorted(set().union(*(df['LOCATION'] for df in panel_frames.values())))
+map_years = list(range(min(df['TIME'].min() for df in panel_frames.values()),
+                       max(df['TIME'].max() for df in panel_frames.values()) + 1))
+location_index = {location: i for i, location in enumerate(map_locations)}
+
+aligned_panel, imputed_panel = interpolate_gaps(build_panel(panel_frames, map_years, map_locations))
+map_panel = carry_forward(aligned_panel)
+
+for name, indicator in map_indicators.items():
+    indicator['index'] = panel_rows[name]
+    # Fixed color range per indicator so colors stay comparable while scrubbing through the years
+    indicator['zmax'] = float(np.nanmax(map_panel[panel_rows[name]]))
+
+map_indicators['Obesity']['zmax'] = float(np.nanmax(map_panel[list(obesity_subject_rows.values())]))
+
+# Correlations and trend lines for every indicator pair and year, computed once. The last year of the carried-forward
+# panel holds each country's latest value; restricted to the countries of the summary datasets it matches exactly
+# the points of the scatter plot.
+# The statistics panel has one row per name of `statistics_indicators` (the obesity row is the averaged series the
+# summary datasets use); `statistics_index` maps an indicator name to its row, independent of the panel row order.
+summary_frames = {
+    'Obesity': obesity_sorted_by_value_df,
+    'Alcohol Consumption': alcohol_sorted_by_value_df,
+    'Daily Smokers': smoke_sorted_by_value_df,
+    'Social Support': social_support_sorted_by_value_df
+}
+statistics_indicators = list(map_indicators)
+statistics_index = {name: i for i, name in enumerate(statistics_indicators)}
+summary_mask = np.array([np.isin(map_locations, summary_frames[name]['LOCATION']) for name in statistics_indicators])
+statistics_rows = [panel_rows['Obesity averaged' if name == 'Obesity' else name] for name in statistics_indicators]
+statistics_panel = np.where(summary_mask[:, None, :], map_panel[statistics_rows], np.nan)
+indicator_statistics = pairwise_statistics(statistics_panel)
+
+
+@lru_cache(maxsize=None)
+def bootstrap_executor(pid):
+    # Bootstrap intervals run in-process unless BOOTSTRAP_WORKERS asks for a process pool. The pool is created per
+    # process id because a pool made before the server forks its workers cannot be used by them. Spawned children
+    # (of this pool or of the report export) re-import the app and must never start a pool of their own.
+    if multiprocessing.parent_process() is not None:
+        return None
+    return process_pool(int(os.environ.get('BOOTSTRAP_WORKERS', 0)))
+
+
+def release_bootstrap_pool():
+    """Shut down this process's bootstrap pool; the next bootstrap not in the cache starts a new one."""
+    executor = bootstrap_executor(os.getpid())
+    if executor is not None:
+        executor.shutdown()
+    bootstrap_executor.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def pair_bootstrap(x_index, y_index, year_index):
+    # Cached per (indicator pair, year); the seed is derived from the key so every worker gets the same intervals
+    year_index %= len(map_years)
+    x = statistics_panel[x_index, year_index]
+    y = statistics_panel[y_index, year_index]
+    valid = ~np.isnan(x) & ~np.isnan(y)
+
+    return bootstrap_intervals(x[valid], y[valid], seed=[x_index, y_index, year_index],
+                               executor=bootstrap_executor(os.getpid()))
@@ -0,0 +1,88 @@
+import logging
+
+import pandas as pd
+
+#############################################################
+
+# Data validation section #
+
+# Checks every indicator dataset once at load time. All datasets are stacked into one frame and each check is a single
+# vectorised expression over it, so validation costs a few milliseconds at startup. Problems are reported, not fixed:
+# the dashboard keeps loading and the report says what to look at.
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['LOCATION', 'INDICATOR', 'SUBJECT', 'MEASURE', 'FREQUENCY', 'TIME', 'Value']
+KEY_COLUMNS = ['LOCATION', 'TIME', 'SUBJECT']
+
+# Plausible value range per unit of measure
+VALUE_RANGES = {
+    'PC_POP15': (0, 100),  # % of population aged 15+
+    'PC': (0, 100),  # %
+    'LT_CAP15': (0, 30)  # litres of pure alcohol per capita aged 15+
+}
+
+# Examples of offending rows kept per check
+SAMPLE_ROWS = 5
+
+
+def read_indicator_csv(path):
+    # The OECD exports start with a byte order mark; decode it explicitly instead of relying on the default codec
+    return pd.read_csv(path, encoding='utf-8-sig')
+
+
+def validate_datasets(datasets):
+    """Validate a mapping of dataset name to raw OECD frame.
+
+    Returns a report dict: ``rows`` per dataset, ``issues`` (check name -> number of offending rows and a few samples)
+    and ``coverage``, a LOCATION x dataset frame of row counts showing which countries have which indicators.
+    """
+    issues = {}
+
+    missing_columns = {name: [column for column in REQUIRED_COLUMNS if column not in df.columns]
+                       for name, df in datasets.items()}
+    for name, columns in missing_columns.items():
+        if columns:
+            issues['schema:' + name] = {'count': len(columns), 'samples': columns}
+
+    valid = {name: df for name, df in datasets.items() if not missing_columns[name]}
+    if not valid:
+        return {'rows': {name: len(df) for name, df in datasets.items()}, 'issues': issues, 'coverage': pd.DataFrame()}
+
+    stacked = pd.concat([df[REQUIRED_COLUMNS] for df in valid.values()], keys=list(valid), names=['dataset', None])
+    stacked = stacked.reset_index(level='dataset').reset_index(drop=True)
+
+    time = pd.to_numeric(stacked['TIME'], errors='coerce')
+    value = pd.to_numeric(stacked['Value'], errors='coerce')
+    low = stacked['MEASURE'].map({measure: bounds[0] for measure, bounds in VALUE_RANGES.items()})
+    high = stacked['MEASURE'].map({measure: bounds[1] for measure, bounds in VALUE_RANGES.items()})
+
+    checks = {
+        'non_numeric_time': time.isna(),
+        'missing_value': value.isna(),
+        'duplicate_key': stacked.duplicated(['dataset'] + KEY_COLUMNS, keep=False),
+        'value_out_of_range': (value < low) | (value > high),
+        'unknown_measure': low.isna(),
+        'invalid_location_code': ~stacked['LOCATION'].astype(str).str.fullmatch('[A-Z]{3}')
+    }
+
+    for check, offending in checks.items():
+        count = int(offending.sum())
+        if count:
+            samples = stacked.loc[offending, ['dataset'] + KEY_COLUMNS + ['MEASURE', 'Value']].head(SAMPLE_ROWS)
+            issues[check] = {'count': count, 'samples': samples.to_dict('records')}
+
+    return {
+        'rows': {name: len(df) for name, df in datasets.items()},
+        'issues': issues,
+        'coverage': pd.crosstab(stacked['LOCATION'], stacked['dataset']).reindex(columns=list(valid), fill_value=0)
+    }
+
+
+def log_report(report):
+    coverage = report['coverage']
+    logger.info('Validated %d rows in %d datasets covering %d locations',
+                sum(report['rows'].values()), len(report['rows']), len(coverage))
+
+    for check, issue in report['issues'].items():
+        logger.warning('Data check %s found %d problem(s), e.g. %s', check, issue['count'], issue['samples'][:2])
@@ -0,0 +1,43 @@
+import numpy as np
+
+#############################################################
+
+# Downsampling section #
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the first and last point and, for every bucket in
+# between, the point forming the largest triangle with the previously kept point and the mean of the next bucket.
+# The visual shape of a line survives with far fewer points than plain decimation keeps.
+
+
+def lttb(x, y, threshold):
+    """Downsample the series ``x``, ``y`` (NaN points dropped) to at most ``threshold`` points."""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    observed = ~np.isnan(x) & ~np.isnan(y)
+    x = x[observed]
+    y = y[observed]
+
+    if threshold < 3 or len(x) <= threshold:
+        return x, y
+
+    # Bucket boundaries for the points between the first and the last one
+    edges = np.linspace(1, len(x) - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0] = 0
+    keep[-1] = len(x) - 1
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Mean of the next bucket; the last bucket looks ahead to the final point
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else len(x)
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        previous_x = x[keep[bucket]]
+        previous_y = y[keep[bucket]]
+        areas = np.abs((previous_x - next_x) * (y[start:end] - previous_y)
+                       - (previous_x - x[start:end]) * (next_y - previous_y))
+        keep[bucket + 1] = start + int(np.argmax(areas))
+
+    return x[keep], y[keep]
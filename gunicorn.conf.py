@@ -0,0 +1,49 @@
+import gc
+import multiprocessing
+import os
+
+#############################################################
+
+# Gunicorn configuration #
+
+# Run with `gunicorn -c gunicorn.conf.py`. Every setting can be overridden from the environment.
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('BIND', '0.0.0.0:8005')
+
+# Callbacks are CPU bound (pandas, NumPy, figure serialisation), so one worker per core; a few threads per worker
+# overlap the short waits on sockets and the indicator store
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('WORKER_THREADS', 4))
+
+# Load and warm the data once in the master; forked workers share those pages copy-on-write
+preload_app = True
+
+# Recycle workers now and then (jitter keeps them from restarting together) to bound any slow memory growth
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 100))
+
+# Report exports run in their own job process, not in a request; restarts let in-flight requests finish
+timeout = int(os.environ.get('WORKER_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach; otherwise the first collection in each
+    # worker touches (and so copies) every preloaded object's page
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # A database file must not stay open for writing in the master while the workers read it (DuckDB allows one
+    # writing process or any number of read-only ones); closing twice is a no-op when a worker is replaced
+    import dashboard_data
+    dashboard_data.indicator_store.close()
+
+
+def post_fork(server, worker):
+    # Each worker opens its own read-only connection instead of sharing the master's
+    import dashboard_data
+    dashboard_data.indicator_store.reconnect()
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from functools import wraps
+
+from dash.exceptions import PreventUpdate
+from flask import Response, jsonify
+
+#############################################################
+
+# Health section #
+
+# Liveness, readiness and data freshness of one worker, plus per-callback metrics.
+#   /healthz  the worker is up; datasets (rows, memory, load time, source mtime, stale flag) and callback metrics
+#   /readyz   503 until every expected dataset is loaded and the figures and caches are warm
+#   /metrics  the same callback metrics in the Prometheus text format
+# Everything is per process: each gunicorn worker answers for itself and reports its pid, so a worker still serving
+# data older than the files on disk shows up as stale.
+
+STEPS = ['data', 'warmup']
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+_started = time.time()
+_completed = {}
+_expected_datasets = []
+_datasets = {}
+
+_metrics_lock = threading.Lock()
+_callbacks = {}
+
+
+def mark_done(step):
+    _completed[step] = time.time() - _started
+
+
+def expect_datasets(names):
+    _expected_datasets.extend(names)
+
+
+def record_dataset(name, path, df, seconds):
+    _datasets[name] = {
+        'path': path,
+        'rows': len(df),
+        'memory_bytes': int(df.memory_usage(deep=True).sum()),
+        'load_seconds': seconds,
+        'source_mtime': os.path.getmtime(path)
+    }
+
+
+def dataset_status():
+    status = {}
+    for name in _expected_datasets:
+        dataset = _datasets.get(name)
+        if dataset is None:
+            status[name] = {'loaded': False}
+            continue
+
+        try:
+            current_mtime = os.path.getmtime(dataset['path'])
+        except OSError:
+            current_mtime = None
+        status[name] = dict(dataset, loaded=True, stale=current_mtime != dataset['source_mtime'])
+    return status
+
+
+def is_ready():
+    return (all(step in _completed for step in STEPS)
+            and all(name in _datasets for name in _expected_datasets))
+
+
+def _no_calls():
+    return {'calls': 0, 'errors': 0, 'prevented': 0, 'seconds_total': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+
+
+def reset_callback_metrics():
+    """Zero every callback's counters, e.g. after warm-up calls that are not traffic."""
+    with _metrics_lock:
+        for name in _callbacks:
+            _callbacks[name] = _no_calls()
+
+
+def timed_callback(name):
+    """Count calls, errors and prevented updates of a Dash callback and record its latency histogram."""
+
+    def decorator(func):
+        with _metrics_lock:
+            _callbacks[name] = _no_calls()
+
+        @wraps(func)
+        def wrapper(*args):
+            outcome = None
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            except PreventUpdate:
+                outcome = 'prevented'
+                raise
+            except Exception:
+                outcome = 'errors'
+                raise
+            finally:
+                seconds = time.perf_counter() - started
+                bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound),
+                              len(LATENCY_BUCKETS))
+                with _metrics_lock:
+                    metrics = _callbacks[name]
+                    metrics['calls'] += 1
+                    metrics['seconds_total'] += seconds
+                    metrics['buckets'][bucket] += 1
+                    if outcome:
+                        metrics[outcome] += 1
+
+        return wrapper
+
+    return decorator
+
+
+def callback_metrics():
+    with _metrics_lock:
+        return {name: {
+            'calls': metrics['calls'],
+            'errors': metrics['errors'],
+            'prevented': metrics['prevented'],
+            'seconds_total': metrics['seconds_total'],
+            'latency_buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], metrics['buckets']))
+        } for name, metrics in _callbacks.items()}
+
+
+def _prometheus_metrics():
+    # The text format wants each metric family as one contiguous group under its TYPE line, so families are the
+    # outer loop and callbacks the inner one
+    callbacks = callback_metrics()
+    lines = []
+
+    for counter in ['calls', 'errors', 'prevented']:
+        lines.append('# TYPE dash_callback_{}_total counter'.format(counter))
+        for name, metrics in callbacks.items():
+            lines.append('dash_callback_{}_total{{callback="{}"}} {}'.format(counter, name, metrics[counter]))
+
+    lines.append('# TYPE dash_callback_seconds histogram')
+    for name, metrics in callbacks.items():
+        label = 'callback="{}"'.format(name)
+
+        # Prometheus buckets are cumulative
+        cumulative = 0
+        for bound, count in metrics['latency_buckets'].items():
+            cumulative += count
+            lines.append('dash_callback_seconds_bucket{{{},le="{}"}} {}'.format(label, bound, cumulative))
+        lines.append('dash_callback_seconds_sum{{{}}} {}'.format(label, metrics['seconds_total']))
+        lines.append('dash_callback_seconds_count{{{}}} {}'.format(label, metrics['calls']))
+
+    return '\n'.join(lines) + '\n'
+
+
+def register_health_routes(server):
+
+    @server.route('/healthz')
+    def healthz():
+        datasets = dataset_status()
+        return jsonify({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': time.time() - _started,
+            'stale': any(dataset.get('stale') for dataset in datasets.values()),
+            'datasets': datasets,
+            'callbacks': callback_metrics()
+        })
+
+    @server.route('/readyz')
+    def readyz():
+        datasets = dataset_status()
+        body = {
+            'ready': is_ready(),
+            'pid': os.getpid(),
+            'steps': {step: {'done': step in _completed, 'seconds_after_start': _completed.get(step)}
+                      for step in STEPS},
+            'datasets': {name: {'loaded': dataset['loaded'], 'rows': dataset.get('rows'),
+                                'load_seconds': dataset.get('load_seconds')}
+                         for name, dataset in datasets.items()}
+        }
+        return jsonify(body), 200 if body['ready'] else 503
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(_prometheus_metrics(), mimetype='text/plain; version=0.0.4')
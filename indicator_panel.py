@@ -0,0 +1,71 @@
+import base64
+
+import numpy as np
+
+#############################################################
+
+# Indicator panel section #
+
+# A panel is a dense float32 array indexed (indicator, year, country) built once from the aggregated `*_full.csv`
+# frames. Views that scrub through years or switch indicators become array slices instead of pandas filters.
+# Missing observations are NaN.
+
+
+def build_panel(frames, years, locations):
+    """Stack aggregated (LOCATION, TIME, Value) frames into an (indicator, year, country) array.
+
+    ``frames`` is an ordered mapping of indicator name to frame; the indicator axis follows its order.
+    """
+    panel = np.full((len(frames), len(years), len(locations)), np.nan, dtype='float32')
+
+    for i, df in enumerate(frames.values()):
+        panel[i] = (df.pivot(index='TIME', columns='LOCATION', values='Value')
+                    .reindex(index=years, columns=locations)
+                    .to_numpy(dtype='float32'))
+
+    return panel
+
+
+def carry_forward(panel):
+    """Fill every year with the latest value observed at or before it, per indicator and country.
+
+    The last year of the result therefore holds each country's most recent value, like the summary datasets do.
+    """
+    observed = ~np.isnan(panel)
+    year_index = np.arange(panel.shape[1])[None, :, None]
+
+    # Index of the most recent observed year so far; 0 where nothing was observed yet (and still NaN there)
+    last_observed = np.maximum.accumulate(np.where(observed, year_index, 0), axis=1)
+
+    return np.take_along_axis(panel, last_observed, axis=1)
+
+
+def typed_array_spec(values):
+    """Encode a float32 array as a plotly.js typed array, for payloads that bypass plotly's own serialiser."""
+    return {'dtype': 'f4', 'bdata': base64.b64encode(np.ascontiguousarray(values, dtype='float32')).decode('ascii')}
+
+
+def interpolate_gaps(panel):
+    """Linearly interpolate the years between two observations, per indicator and country.
+
+    Years before the first or after the last observation are left NaN (no extrapolation). Returns the filled panel
+    and a boolean array of the same shape flagging the imputed values.
+    """
+    observed = ~np.isnan(panel)
+    year_count = panel.shape[1]
+    year_index = np.broadcast_to(np.arange(year_count)[None, :, None], panel.shape)
+
+    # Nearest observed year at or before / at or after each year (-1 and year_count when there is none)
+    previous = np.maximum.accumulate(np.where(observed, year_index, -1), axis=1)
+    following = np.flip(np.minimum.accumulate(np.flip(np.where(observed, year_index, year_count), axis=1), axis=1),
+                        axis=1)
+
+    imputed = ~observed & (previous >= 0) & (following < year_count)
+    previous_value = np.take_along_axis(panel, np.maximum(previous, 0), axis=1)
+    following_value = np.take_along_axis(panel, np.minimum(following, year_count - 1), axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = (year_index - previous) / (following - previous)
+    filled = np.where(imputed, previous_value + weight * (following_value - previous_value), panel)
+
+    return filled.astype(panel.dtype), imputed
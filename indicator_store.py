@@ -0,0 +1,191 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+
+import pandas as pd
+
+#############################################################
+
+# Indicator store section #
+
+# An embedded analytical store for the OECD indicator CSVs. Every dataset is ingested into one `observations` table
+# indexed on (INDICATOR, LOCATION, TIME, SUBJECT). Only the latest-value lookups go through it (the pie charts and
+# the scatter plot); the panels, bar charts and line charts are built from the DataFrames the dashboard loads anyway,
+# so those frames stay and the store is ingested from them rather than from a second parse of the files.
+# SQLite (standard library, in memory by default) is always available; DuckDB is used instead when installed and
+# asked for with INDICATOR_STORE=duckdb. INDICATOR_STORE_PATH can point at a database file shared by every worker
+# instead of one in-memory copy each: the master ingests it and closes its connection before forking, and the workers
+# reopen it read-only (DuckDB refuses a file that another process holds open for writing). A database file is reused
+# only while its recorded source fingerprint matches the loaded frames; otherwise it is re-ingested, always in one
+# transaction, so a crash mid-ingest leaves the previous content and fingerprint rather than a partial store.
+# Queries are fixed SQL strings with parameters, so the connection's statement cache keeps them prepared, and their
+# results are cached per arguments: the data never changes after ingestion.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    dataset TEXT NOT NULL,
+    indicator TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    measure TEXT NOT NULL,
+    location TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    value DOUBLE NOT NULL
+)
+"""
+
+_INDEX = """
+CREATE INDEX IF NOT EXISTS observations_key ON observations (dataset, indicator, location, time, subject)
+"""
+
+_META = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)
+"""
+
+# Columns of a raw OECD frame that are ingested, in the order of the observations table
+_COLUMNS = ['INDICATOR', 'SUBJECT', 'MEASURE', 'LOCATION', 'TIME', 'Value']
+
+# Mean over subjects per (location, year), then each location's most recent year; the same values as the
+# `*_sorted_by_value_df` frames of the dashboard
+_LATEST_VALUES = """
+WITH per_year AS (
+    SELECT location, time, AVG(value) AS value
+    FROM observations
+    WHERE dataset = ? AND indicator = ?
+    GROUP BY location, time
+)
+SELECT location, time, value
+FROM per_year
+WHERE time = (SELECT MAX(time) FROM per_year AS latest WHERE latest.location = per_year.location)
+ORDER BY value
+"""
+
+_LATEST_VALUE = """
+SELECT AVG(value)
+FROM observations
+WHERE dataset = ? AND indicator = ? AND location = ?
+  AND time = (SELECT MAX(time) FROM observations WHERE dataset = ? AND indicator = ? AND location = ?)
+"""
+
+
+class IndicatorStore:
+
+    def __init__(self, path=':memory:', backend='sqlite'):
+        self.backend = backend
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = self._connect()
+        for statement in [_SCHEMA, _INDEX, _META]:
+            self._connection.execute(statement)
+
+    def _connect(self, read_only=False):
+        if self.backend == 'duckdb':
+            import duckdb
+            return duckdb.connect(self.path, read_only=read_only)
+        if read_only:
+            return sqlite3.connect('file:{}?mode=ro'.format(self.path), uri=True, check_same_thread=False,
+                                   cached_statements=64)
+        return sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+
+    # An in-memory database only exists in its connection, so close() and reconnect() keep that one (each worker
+    # then has its own copy)
+
+    def close(self):
+        """Close the connection to a database file, e.g. in the master before it forks the workers."""
+        if self.path != ':memory:' and self._connection is not None:
+            with self._lock:
+                self._connection.close()
+                self._connection = None
+
+    def reconnect(self):
+        """Open a fresh read-only connection to a database file, e.g. in a freshly forked worker."""
+        if self.path != ':memory:':
+            self._lock = threading.Lock()
+            self._connection = self._connect(read_only=True)
+
+    def _query(self, sql, parameters):
+        # One connection shared by the callback threads of a worker; SQLite and DuckDB connections are not
+        # safe to use concurrently
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def source(self):
+        """Fingerprint of the frames the store was last ingested from, or None for a new store."""
+        rows = self._query("SELECT value FROM meta WHERE key = 'source'", [])
+        return rows[0][0] if rows else None
+
+    def ingest(self, datasets, source):
+        """Replace the content of the store with the rows of ``datasets`` that have a value and record ``source``.
+
+        ``datasets`` maps a dataset name to raw OECD frames (as read by the dashboard).
+        """
+        rows = [(dataset, indicator, subject, measure, location, int(time), float(value))
+                for dataset, frames in datasets.items() for df in frames
+                for indicator, subject, measure, location, time, value
+                in df[_COLUMNS].dropna().itertuples(index=False)]
+
+        with self._lock:
+            self._connection.execute('BEGIN TRANSACTION')
+            try:
+                self._connection.execute('DELETE FROM observations')
+                self._connection.executemany('INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+                self._connection.execute("DELETE FROM meta WHERE key = 'source'")
+                self._connection.execute("INSERT INTO meta VALUES ('source', ?)", [source])
+                self._connection.commit()
+            except BaseException:
+                self._connection.rollback()
+                raise
+
+        self._clear_caches()
+        return len(rows)
+
+    def _clear_caches(self):
+        self.latest_values.cache_clear()
+        self.latest_value.cache_clear()
+
+    @lru_cache(maxsize=None)
+    def latest_values(self, indicator, dataset='summary'):
+        """Each location's most recent value as a (LOCATION, TIME, Value) frame sorted by value."""
+        return pd.DataFrame(self._query(_LATEST_VALUES, [dataset, indicator]), columns=['LOCATION', 'TIME', 'Value'])
+
+    @lru_cache(maxsize=4096)
+    def latest_value(self, indicator, location, dataset='summary'):
+        """The most recent value of one location, or None when the location has no data for the indicator."""
+        return self._query(_LATEST_VALUE, [dataset, indicator, location] * 2)[0][0]
+
+    def latest_pair(self, x_indicator, y_indicator, dataset='summary'):
+        """Latest values of two indicators for the locations that have both, as (LOCATION, x, y) columns."""
+        x = self.latest_values(x_indicator, dataset)
+        y = self.latest_values(y_indicator, dataset)
+        return pd.merge(x[['LOCATION', 'Value']], y[['LOCATION', 'Value']], on='LOCATION', suffixes=('_x', '_y'))
+
+
+def source_fingerprint(datasets):
+    """Digest of the ingested columns of every frame; it changes with any edited, added or removed row."""
+    digest = hashlib.sha256()
+    for dataset, frames in datasets.items():
+        for df in frames:
+            digest.update(dataset.encode())
+            digest.update(pd.util.hash_pandas_object(df[_COLUMNS], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def open_store(datasets, backend=None, path=None):
+    """Open the store configured by INDICATOR_STORE / INDICATOR_STORE_PATH, (re-)ingesting ``datasets`` unless it
+    already holds exactly them.
+
+    ``datasets`` maps a dataset name ('summary' or 'full') to the raw frames of its files.
+    """
+    backend = backend or os.environ.get('INDICATOR_STORE', 'sqlite')
+    path = path or os.environ.get('INDICATOR_STORE_PATH', ':memory:')
+    store = IndicatorStore(path, backend)
+
+    source = source_fingerprint(datasets)
+    if store.source() != source:
+        store.ingest(datasets, source)
+
+    return store
@@ -1,58 +1,28 @@
-from dash import Dash, dcc, html, Output, Input, callback
+from functools import lru_cache
+
+from dash import Dash, dcc, html, Output, Input, State, Patch, callback, no_update, page_container, page_registry, \
+    register_page
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.colors import make_colorscale
 import dash_bootstrap_components as dbc
 
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-
-#############################################################
-
-# Data Processing section #
-
-# transform obesity dataset
-obesity_df = pd.read_csv("obesity_by_country.csv")
-obesity_mean_df = obesity_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
-obesity_maxyear_df = obesity_mean_df.loc[obesity_mean_df.groupby('LOCATION')['TIME'].idxmax()]
-obesity_sorted_by_value_df = obesity_maxyear_df.sort_values(by="Value")
-
-# transform alcohol dataset
-alcohol_df = pd.read_csv("alcohol_by_country.csv")
-alcohol_remove_col_df = alcohol_df[['LOCATION', 'TIME', 'Value']]
-alcohol_maxyear_df = alcohol_remove_col_df.loc[alcohol_remove_col_df.groupby('LOCATION')['TIME'].idxmax()].sort_index()
-alcohol_sorted_by_value_df = alcohol_maxyear_df.sort_values(by="Value")
-
-# transform smoke dataset
-smoke_df = pd.read_csv("smoke_by_country.csv")
-smoke_remove_col_df = smoke_df[['LOCATION', 'TIME', 'Value']]
-smoke_maxyear_df = smoke_remove_col_df.loc[smoke_remove_col_df.groupby('LOCATION')['TIME'].idxmax()].sort_index()
-smoke_sorted_by_value_df = smoke_maxyear_df.sort_values(by="Value")
-
-# transform social support dataset
-social_support_df = pd.read_csv("socialsupport_by_country.csv")
-social_support_remove_col_df = social_support_df[['LOCATION', 'TIME', 'Value']]
-social_support_maxyear_df = social_support_remove_col_df.loc[
-    social_support_remove_col_df.groupby('LOCATION')['TIME'].idxmax()].sort_index()
-social_support_sorted_by_value_df = social_support_maxyear_df.sort_values(by="Value")
-
-# merge obesity and alcohol dataset
-merged_df = pd.merge(obesity_sorted_by_value_df, alcohol_sorted_by_value_df, on='LOCATION')
-merged_df = merged_df[['LOCATION', 'Value_x', 'Value_y']]
-merged_df = merged_df.rename(columns={'Value_x': 'Obesity_value', 'Value_y': 'Alcohol_value'})
-
-# country list
-country_df = obesity_sorted_by_value_df[['LOCATION']]
-country_list = country_df['LOCATION'].tolist()
-
-# Data filtered by country (For line chart part)
-obesity_full_df = pd.read_csv("obesity_by_country_full.csv")
-obesity_mean_full_df = obesity_full_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
-mask = obesity_mean_full_df['LOCATION'] == country_list[0]
-obesity_mean_full_filtered_df = obesity_mean_full_df[mask]
-
-alcohol_full_df = pd.read_csv("alcohol_by_country_full.csv")
-alcohol_mean_full_df = alcohol_full_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
-mask = alcohol_mean_full_df['LOCATION'] == country_list[0]
-alcohol_mean_full_filtered_df = alcohol_mean_full_df[mask]
+from dashboard_data import aligned_panel, alcohol_sorted_by_value_df, country_list, factor_subject_rows, \
+    imputed_panel, indicator_statistics, indicator_store, location_index, map_indicators, map_locations, map_panel, \
+    map_years, merged_df, obesity_sorted_by_value_df, obesity_subject_rows, pair_bootstrap, release_bootstrap_pool, \
+    smoke_sorted_by_value_df, social_support_sorted_by_value_df, statistics_index, statistics_indicators, \
+    summary_frames
+from downsampling import lttb
+from health import mark_done, register_health_routes, reset_callback_metrics, timed_callback
+from indicator_panel import typed_array_spec
+from report_export import register_export_route
+from request_coalescing import coalesced, new_session_id
+
+# One multi-page app over the data of dashboard_data, loaded once per process; the pages are registered in the App
+# Layout section
+app = Dash(__name__, use_pages=True, pages_folder='', external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 #############################################################
 
@@ -60,13 +30,15 @@ alcohol_mean_full_filtered_df = alcohol_mean_full_df[mask]
 
 # Choropleth Map
 
-fig_map = px.choropleth(data_frame=obesity_sorted_by_value_df
-                        , locations='LOCATION'
-                        , color='Value'
-                        , locationmode='ISO-3'
-                        , color_continuous_scale='Aggrnyl'
-                        , range_color=[0, obesity_sorted_by_value_df['Value'].max()]
-                        , labels={'Value': 'Obese<br>(population %)'})
+map_colorscale = make_colorscale(px.colors.sequential.Aggrnyl)
+
+fig_map = go.Figure(go.Choropleth(locations=map_locations
+                                  , z=map_panel[obesity_subject_rows['PREFERRED'], -1]
+                                  , locationmode='ISO-3'
+                                  , colorscale=map_colorscale
+                                  , zmin=0, zmax=map_indicators['Obesity']['zmax']
+                                  , colorbar_title_text=map_indicators['Obesity']['label']
+                                  , hovertemplate='%{location}: %{z:.1f}<extra></extra>'))
 
 fig_map = fig_map.update_layout(geo=dict(bgcolor='black',
                                          projection_type='orthographic',
@@ -76,11 +48,46 @@ fig_map = fig_map.update_layout(geo=dict(bgcolor='black',
                                 margin=dict(l=0, r=0, t=0, b=0),
                                 font_color='#00ff85')
 
+# Bar charts
+
+def bar_chart(df, y_label, title):
+    return px.bar(df
+                  , x='LOCATION', y='Value'
+                  , color_discrete_sequence=['#00ff85']
+                  , text_auto='.2s'
+                  , labels={
+                        "LOCATION": "Country",
+                        "Value": y_label
+                    }).update_layout(
+        plot_bgcolor='black',
+        paper_bgcolor='black',
+        font_color='#00ff85',
+        xaxis_tickangle=-45,
+        title={
+            'text': "<b> " + title + " </b>",
+            'font': {
+                'size': 20,
+                'color': '#00ff85'
+            }
+        }
+    ).update_traces(textposition="outside")
+
+
+fig_barChart1 = bar_chart(obesity_sorted_by_value_df, "Population (%)", "Obese (% of population aged 15+)")
+
+fig_barChart2 = bar_chart(alcohol_sorted_by_value_df, "Litre/Capita", "Alcohol Consumption (lcpd, aged 15+)")
+
+fig_barChart3 = bar_chart(smoke_sorted_by_value_df, "Population (%)", "Daily Smokers (% of population aged 15+)")
+
+fig_barChart4 = bar_chart(social_support_sorted_by_value_df, "Population (%)",
+                          "Social Support (% of population aged 15+)")
+
 # Scatter Plot
 
 fig_scatterPlot = px.scatter(merged_df
                              , x='Alcohol_value', y='Obesity_value'
                              , size='Obesity_value'
+                             , custom_data=['LOCATION']
                              , title='Obese (% of population aged 15+) vs Alcohol Consumption (Litre/Capita, aged 15+)'
                              , color='Alcohol_value'
                              , color_continuous_scale=['white', '#62fbd3', '#00ff85']
@@ -95,68 +102,237 @@ fig_scatterPlot = fig_scatterPlot.update_layout(
     , paper_bgcolor='black'
     , font_color='#00ff85')
 
-# Line chart
-
-fig_lineChart1 = px.line(obesity_mean_full_filtered_df
-                         , x="TIME", y="Value"
-                         , title='Obese (% of population aged 15+)'
-                         , markers=True
-                         , labels={
-                                 "TIME": "Year",
-                                 "Value": "Population (%)"
-                           })
 
-fig_lineChart1 = fig_lineChart1.update_layout(
-    plot_bgcolor='black'
+def add_trend_overlay(fig, chosen_factor):
+    # Overlay the precomputed OLS trend line, its 95% band and the correlations of obesity vs the chosen factor
+    pair = (statistics_index[chosen_factor], statistics_index['Obesity'], -1)
+    bootstrap = pair_bootstrap(*pair)
+    trend_x = indicator_statistics['trend_x'][pair]
+
+    fig.add_trace(go.Scatter(x=np.concatenate([trend_x, trend_x[::-1]])
+                             , y=np.concatenate([indicator_statistics['trend_high'][pair],
+                                                 indicator_statistics['trend_low'][pair][::-1]])
+                             , fill='toself', fillcolor='rgba(0, 255, 133, 0.15)'
+                             , line_width=0, hoverinfo='skip', showlegend=False))
+
+    fig.add_trace(go.Scatter(x=trend_x, y=indicator_statistics['trend_y'][pair]
+                             , mode='lines', line=dict(color='#00ff85', dash='dash')
+                             , hoverinfo='skip', showlegend=False))
+
+    fig.add_annotation(xref='paper', yref='paper', x=1, y=1, xanchor='right', yanchor='top'
+                       , text='Pearson r = {:.2f} [{:.2f}, {:.2f}]<br>Spearman ρ = {:.2f}<br>'
+                              'slope = {:.2f} [{:.2f}, {:.2f}], n = {}<br>'
+                              'bootstrap 95%: r [{:.2f}, {:.2f}], slope [{:.2f}, {:.2f}]'.format(
+                                   indicator_statistics['pearson'][pair], indicator_statistics['pearson_low'][pair],
+                                   indicator_statistics['pearson_high'][pair], indicator_statistics['spearman'][pair],
+                                   indicator_statistics['slope'][pair], indicator_statistics['slope_low'][pair],
+                                   indicator_statistics['slope_high'][pair], indicator_statistics['n'][pair],
+                                   bootstrap['pearson_low'], bootstrap['pearson_high'],
+                                   bootstrap['slope_low'], bootstrap['slope_high'])
+                       , align='right', showarrow=False)
+
+    return fig
+
+
+# Cross-filtering
+
+# Countries picked on the map, the bars or the scatter plot are kept in the `selectedCountries` store and highlighted
+# on every chart through `selectedpoints`, which plotly.js applies without redrawing the figure. The point order of each
+# figure is known here, so a selection turns into a few index lists sent as patches.
+scatter_indicator_codes = {
+    'Alcohol Consumption': 'ALCOHOL',
+    'Daily Smokers': 'SMOKERS',
+    'Social Support': 'SOCSUPPORT'
+}
+
+bar_locations = [df['LOCATION'].tolist() for df in summary_frames.values()]
+
+
+def scatter_locations(chosen_factor):
+    return indicator_store.latest_pair('OVEROBESE', scatter_indicator_codes.get(chosen_factor, 'SOCSUPPORT'))[
+        'LOCATION'].tolist()
+
+
+def selected_indices(locations, selected_countries):
+    # None clears the selection; an empty list would dim every point
+    if not selected_countries:
+        return None
+    selected = set(selected_countries)
+    return [i for i, location in enumerate(locations) if location in selected]
+
+# Correlation matrix
+
+fig_correlationMatrix = go.Figure(go.Heatmap(z=indicator_statistics['pearson'][:, :, -1]
+                                             , x=statistics_indicators, y=statistics_indicators
+                                             , zmin=-1, zmax=1
+                                             , colorscale=['red', 'black', '#00ff85']
+                                             , texttemplate='%{z:.2f}'
+                                             , hovertemplate='%{x} vs %{y}: %{z:.2f}<extra></extra>'))
+
+fig_correlationMatrix = fig_correlationMatrix.update_layout(
+    title='Pearson correlation between indicators ({})'.format(map_years[-1])
+    , yaxis_autorange='reversed'
+    , plot_bgcolor='black'
     , paper_bgcolor='black'
     , font_color='#00ff85')
 
-fig_lineChart1 = fig_lineChart1.update_traces(
-    line_color='#00ff85')
+# Line chart
 
-fig_lineChart2 = px.line(alcohol_mean_full_filtered_df
-                         , x="TIME", y="Value"
-                         , title='Alcohol Consumption (lcpd, aged 15+)'
-                         , markers=True
-                         , labels={
-                                 "TIME": "Year",
-                                 "Value": "Litre/Capita"
-                           })
+# Line charts slice the aligned panel: one row per indicator (per survey method for obesity), one column per country.
+# Interpolated years are drawn with open markers.
+line_years = np.array(map_years, dtype='int16')
+
+# Sub-group choices of the line charts, in dropdown order; the rows behind them are in `factor_subject_rows`
+subject_labels = {
+    'TOT': 'Total',
+    'MEN': 'Men',
+    'WOMEN': 'Women',
+    'YOUNG': 'Aged 15-29',
+    'MIDDLE_AGED': 'Aged 30-49',
+    'OLD': 'Aged 50+',
+    'PRY': 'Primary education',
+    'SRY': 'Secondary education',
+    'TRY': 'Tertiary education'
+}
+
+
+def subject_options(chosen_life_factor):
+    # Total first, then the sub-groups in the order of `subject_labels`
+    subjects = factor_subject_rows.get(chosen_life_factor, {'TOT': None})
+    return [{'label': label, 'value': subject} for subject, label in subject_labels.items() if subject in subjects]
+
+
+obesity_subject_options = [
+    {'label': 'Measured, else self-reported', 'value': 'PREFERRED'},
+    {'label': 'Measured', 'value': 'MEASURED'},
+    {'label': 'Self-reported', 'value': 'SELFREPORTED'}
+]
+
+line_chart_labels = {
+    'Obesity': ('Obese (% of population aged 15+)', 'Population (%)'),
+    'Alcohol Consumption': ('Alcohol Consumption (lcpd, aged 15+)', 'Litre/Capita'),
+    'Daily Smokers': ('Daily Smokers (% of population aged 15+)', 'Population (%)'),
+    'Social Support': ('Social Support (% of population aged 15+)', 'Population (%)')
+}
+
+
+def line_chart_title(indicator_name, subject='TOT'):
+    title, y_label = line_chart_labels[indicator_name]
+    if subject != 'TOT':
+        title += ' - ' + subject_labels.get(subject, subject)
+    return title, y_label
+
+
+def single_line_chart(indicator_name, row, chosen_country, line_color, subject='TOT'):
+    column = location_index.get(chosen_country)
+    values = aligned_panel[row, :, column] if column is not None else np.full(len(line_years), np.nan)
+    imputed = imputed_panel[row, :, column] if column is not None else np.zeros(len(line_years), dtype=bool)
+    present = ~np.isnan(values)
+    title, y_label = line_chart_title(indicator_name, subject)
+
+    fig = px.line(pd.DataFrame({'TIME': line_years[present], 'Value': values[present]})
+                  , x="TIME", y="Value"
+                  , title=title
+                  , markers=True
+                  , labels={
+                        "TIME": "Year",
+                        "Value": y_label
+                    })
+
+    fig = fig.update_layout(
+        plot_bgcolor='black'
+        , paper_bgcolor='black'
+        , font_color='#00ff85')
 
-fig_lineChart2 = fig_lineChart2.update_layout(
-    plot_bgcolor='black'
-    , paper_bgcolor='black'
-    , font_color='#00ff85')
+    fig = fig.update_traces(
+        line_color=line_color
+        , marker_symbol=np.where(imputed[present], 'circle-open', 'circle')
+        , customdata=np.where(imputed[present], ' (interpolated)', '')
+        , hovertemplate='Year=%{x}<br>' + y_label + '=%{y:.1f}%{customdata}<extra></extra>')
+
+    return fig
+
+
+fig_lineChart1 = single_line_chart('Obesity', obesity_subject_rows['PREFERRED'], country_list[0], '#00ff85')
+
+fig_lineChart2 = single_line_chart('Alcohol Consumption', map_indicators['Alcohol Consumption']['index'],
+                                   country_list[0], 'red')
+
+# Line chart comparison mode
+
+# Past LINE_POINT_BUDGET points in total each series is downsampled with LTTB to its share of the budget, and past
+# WEBGL_POINTS the traces switch to WebGL so the browser stays responsive with every country on screen.
+LINE_POINT_BUDGET = 1500
+WEBGL_POINTS = 1000
+
+
+def comparison_line_chart(indicator_name, row, locations, chosen_country, subject='TOT'):
+    columns = [location_index[location] for location in locations]
+    series = aligned_panel[row][:, columns]
+    imputed = imputed_panel[row][:, columns]
+    total_points = int(np.count_nonzero(~np.isnan(series)))
+    points_per_series = max(LINE_POINT_BUDGET // len(locations), 3)
+    trace_type = go.Scattergl if total_points > WEBGL_POINTS else go.Scatter
+    colors = px.colors.qualitative.Light24
+
+    fig = go.Figure()
+    for i, location in enumerate(locations):
+        x, y = lttb(line_years, series[:, i], points_per_series)
+        # LTTB keeps original points, so the kept years index back into the imputed flags
+        flagged = imputed[x.astype(int) - line_years[0], i]
+        chosen = location == chosen_country
+        # Interpolated years are open markers as in the single-country chart; the other countries only mark those
+        fig.add_trace(trace_type(x=x.astype('int16'), y=y.astype('float32'), name=location
+                                 , mode='lines+markers'
+                                 , line=dict(color='#00ff85' if chosen else colors[i % len(colors)],
+                                             width=3 if chosen else 1)
+                                 , marker=dict(symbol=np.where(flagged, 'circle-open', 'circle'),
+                                               size=np.where(flagged | chosen, 6, 0))
+                                 , customdata=np.where(flagged, ' (interpolated)', '')
+                                 , hovertemplate=location + ' %{x}: %{y:.1f}%{customdata}<extra></extra>'))
+
+    title, y_label = line_chart_title(indicator_name, subject)
+    fig = fig.update_layout(
+        title=title
+        , xaxis_title='Year', yaxis_title=y_label
+        , plot_bgcolor='black'
+        , paper_bgcolor='black'
+        , font_color='#00ff85')
+
+    return fig
+
+
+def comparison_locations(comparison_set, chosen_country):
+    """Resolve a comparison key: '*' for every country, else country codes joined with dots ('DEU.FRA')."""
+    if comparison_set == '*':
+        return map_locations
 
-fig_lineChart2 = fig_lineChart2.update_traces(
-    line_color='red')
+    compared = [country for country in comparison_set.split('.') if country != chosen_country]
+    return [location for location in [chosen_country] + compared if location in location_index]
+
+
+@lru_cache(maxsize=256)
+def comparison_line_charts(obesity_row, chosen_life_factor, factor_row, subject, comparison_set, chosen_country):
+    # Keyed by small hashable values only, so sessions asking for the same comparison share the figures
+    locations = comparison_locations(comparison_set, chosen_country)
+    return (comparison_line_chart('Obesity', obesity_row, locations, chosen_country),
+            comparison_line_chart(chosen_life_factor, factor_row, locations, chosen_country, subject))
 
 #############################################################
 
 # App Layout section #
 
-app.layout = html.Div(
-    id="root",
-    children=[
+# Pages
 
-        # Header
+# Every page is served by this one process from the data of dashboard_data and the figures above:
+#   /          the full dashboard
+#   /map       the map on its own
+#   /scatter   two scatter plots side by side, to compare lifestyle factors
+#   /header    the header alone
+# The session stores and the header live in the root layout, so they are shared by all pages.
 
-        html.Div(
-            id="header",
-            children=[
-                html.A(
-                    html.Img(id="logo", src=app.get_asset_url("dash-logo.png")),
-                    href="https://plotly.com/dash/",
-                ),
-                html.H4(children="A Comparative Analysis of Obesity & Lifestyle Factors In OECD Countries"),
-                html.P(
-                    id="description",
-                    children="Obesity has become a major public health concern in many countries. "
-                             "While several lifestyle factors have been identified as potential contributors to obesity, "
-                             "the relationship between obesity and these factors is not well understood.",
-                ),
-            ],
-        ),
+dashboard_layout = html.Div(
+    children=[
 
         # Map
 
@@ -165,10 +341,20 @@ app.layout = html.Div(
                 dbc.Row([
 
                     dbc.Col([
+                        dcc.Dropdown(id='mapDropdown', options=list(map_indicators), value='Obesity',
+                                     clearable=False),
+                        dcc.RadioItems(id='obesitySubject', options=obesity_subject_options, value='PREFERRED',
+                                       inline=True, inputStyle={'margin': '0 5px 0 15px'},
+                                       style={'color': '#00ff85'}),
+                        html.Button('Clear selected countries', id='clearSelection', n_clicks=0),
                         dcc.Graph(
                             id='map',
                             figure=fig_map
                         ),
+                        dcc.Slider(id='mapYearSlider', min=map_years[0], max=map_years[-1], step=1,
+                                   value=map_years[-1], updatemode='drag',
+                                   marks={year: str(year) for year in map_years if year % 10 == 0},
+                                   tooltip={'placement': 'bottom'}),
                     ], width=6, className='barContainer'),
 
                     dbc.Col([
@@ -214,26 +400,7 @@ app.layout = html.Div(
                     dbc.Col([
                         dcc.Graph(
                             id='barChart1',
-                            figure=px.bar(obesity_sorted_by_value_df
-                                          , x='LOCATION', y='Value'
-                                          , color_discrete_sequence=['#00ff85']
-                                          , text_auto='.2s'
-                                          , labels={
-                                                 "LOCATION": "Country",
-                                                 "Value": "Population (%)"
-                                             }).update_layout(
-                                plot_bgcolor='black',
-                                paper_bgcolor='black',
-                                font_color='#00ff85',
-                                xaxis_tickangle=-45,
-                                title={
-                                    'text': "<b> Obese (% of population aged 15+) </b>",
-                                    'font': {
-                                        'size': 20,
-                                        'color': '#00ff85'
-                                    }
-                                }
-                            ).update_traces(textposition="outside"),
+                            figure=fig_barChart1,
                             style={
                                 'border': '2px solid white',
                                 'border-radius': '2px',
@@ -245,26 +412,7 @@ app.layout = html.Div(
                     dbc.Col([
                         dcc.Graph(
                             id='barChart2',
-                            figure=px.bar(alcohol_sorted_by_value_df
-                                          , x='LOCATION', y='Value'
-                                          , color_discrete_sequence=['#00ff85']
-                                          , text_auto='.2s'
-                                          , labels={
-                                                "LOCATION": "Country",
-                                                "Value": "Litre/Capita"
-                                            }).update_layout(
-                                plot_bgcolor='black',
-                                paper_bgcolor='black',
-                                font_color='#00ff85',
-                                xaxis_tickangle=-45,
-                                title={
-                                    'text': "<b> Alcohol Consumption (lcpd, aged 15+) </b>",
-                                    'font': {
-                                        'size': 20,
-                                        'color': '#00ff85'
-                                    }
-                                }
-                            ).update_traces(textposition="outside"),
+                            figure=fig_barChart2,
                             style={
                                 'border': '2px solid white',
                                 'border-radius': '2px',
@@ -286,26 +434,7 @@ app.layout = html.Div(
                     dbc.Col([
                         dcc.Graph(
                             id='barChart3',
-                            figure=px.bar(smoke_sorted_by_value_df
-                                          , x='LOCATION', y='Value'
-                                          , color_discrete_sequence=['#00ff85']
-                                          , text_auto='.2s'
-                                          , labels={
-                                                "LOCATION": "Country",
-                                                "Value": "Population (%)"
-                                            }).update_layout(
-                                plot_bgcolor='black',
-                                paper_bgcolor='black',
-                                font_color='#00ff85',
-                                xaxis_tickangle=-45,
-                                title={
-                                    'text': "<b> Daily Smokers (% of population aged 15+) </b>",
-                                    'font': {
-                                        'size': 20,
-                                        'color': '#00ff85'
-                                    }
-                                }
-                            ).update_traces(textposition="outside"),
+                            figure=fig_barChart3,
                             style={
                                 'border': '2px solid white',
                                 'border-radius': '2px',
@@ -317,26 +446,7 @@ app.layout = html.Div(
                     dbc.Col([
                         dcc.Graph(
                             id='barChart4',
-                            figure=px.bar(social_support_sorted_by_value_df
-                                          , x='LOCATION', y='Value'
-                                          , color_discrete_sequence=['#00ff85']
-                                          , text_auto='.2s'
-                                          , labels={
-                                                "LOCATION": "Country",
-                                                "Value": "Population (%)"
-                                            }).update_layout(
-                                plot_bgcolor='black',
-                                paper_bgcolor='black',
-                                font_color='#00ff85',
-                                xaxis_tickangle=-45,
-                                title={
-                                    'text': "<b> Social Support (% of population aged 15+) </b>",
-                                    'font': {
-                                        'size': 20,
-                                        'color': '#00ff85'
-                                    }
-                                }
-                            ).update_traces(textposition="outside"),
+                            figure=fig_barChart4,
                             style={
                                 'border': '2px solid white',
                                 'border-radius': '2px',
@@ -357,7 +467,7 @@ app.layout = html.Div(
                     dbc.Col([
                         'Select a Lifestyle Factor to compare with:',
                         dcc.Dropdown(id='scatterDropdown', options=['Alcohol Consumption', 'Daily Smokers', 'Social Support'],
-                                     value='Alcohol')
+                                     value='Alcohol Consumption')
                     ], width=12, style={'color': '#00ff85'}),
                     dbc.Col([
                         dcc.Graph(
@@ -376,6 +486,33 @@ app.layout = html.Div(
             ]
         ),
 
+        # Correlation Matrix Container
+
+        html.Div(
+            children=[
+                dbc.Row([
+                    dbc.Col([
+                        'Correlation method (year follows the map slider):',
+                        dcc.RadioItems(id='correlationMethod', options=['Pearson', 'Spearman'], value='Pearson',
+                                       inline=True, inputStyle={'margin': '0 5px 0 15px'})
+                    ], width=12, style={'color': '#00ff85'}),
+                    dbc.Col([
+                        dcc.Graph(
+                            id='correlationMatrix',
+                            figure=fig_correlationMatrix
+                        )
+                    ], width=12),
+                ],
+                    style={
+                        'border': '2px solid white',
+                        'border-radius': '2px',
+                        'border-width': 'thin'
+                    }
+                    , className='scatterPlotContainer'
+                )
+            ]
+        ),
+
         # Line Charts Container
 
         html.Div(
@@ -389,9 +526,19 @@ app.layout = html.Div(
                     dbc.Col([
                         "Select a Lifestyle Factor to compare with:",
                         dcc.Dropdown(id='lineChartDropdown2', options=['Alcohol Consumption', 'Daily Smokers', 'Social Support'],
-                                     value='Alcohol')
+                                     value='Alcohol Consumption'),
+                        "Sub-group:",
+                        dcc.Dropdown(id='lineChartSubgroup', options=subject_options('Alcohol Consumption'),
+                                     value='TOT', clearable=False)
                     ], width=6, className='lineChartDropdown'),
 
+                    dbc.Col([
+                        "Compare with other countries:",
+                        dcc.Dropdown(id='lineChartCompare', options=map_locations, value=[], multi=True),
+                        dcc.Checklist(id='lineChartCompareAll', options=['Compare all countries'], value=[],
+                                      inputStyle={'margin-right': '5px'})
+                    ], width=12, className='lineChartDropdown'),
+
                     dbc.Col([
                         dcc.Graph(
                             id='lineChart1',
@@ -419,13 +566,180 @@ app.layout = html.Div(
 
     ])
 
+map_page_layout = html.Div(
+    children=[
+        dcc.Dropdown(id='mapPageDropdown', options=list(map_indicators), value='Obesity', clearable=False),
+        dcc.Graph(
+            id='mapPageGraph',
+            figure=fig_map,
+            style={'height': '75vh'}
+        ),
+        dcc.Slider(id='mapPageYearSlider', min=map_years[0], max=map_years[-1], step=1, value=map_years[-1],
+                   updatemode='drag', marks={year: str(year) for year in map_years if year % 10 == 0},
+                   tooltip={'placement': 'bottom'})
+    ], className='barContainer')
+
+scatter_page_layout = html.Div(
+    children=[
+        dbc.Row([
+            dbc.Col([
+                dcc.Dropdown(id='scatterPageDropdown1', options=list(scatter_indicator_codes),
+                             value='Alcohol Consumption', clearable=False)
+            ], width=6, style={'color': '#00ff85'}),
+            dbc.Col([
+                dcc.Dropdown(id='scatterPageDropdown2', options=list(scatter_indicator_codes),
+                             value='Daily Smokers', clearable=False)
+            ], width=6, style={'color': '#00ff85'})
+        ]),
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='scatterPageChart1')
+            ], width=6),
+            dbc.Col([
+                dcc.Graph(id='scatterPageChart2')
+            ], width=6)
+        ])
+    ], className='scatterPlotContainer')
+
+register_page('dashboard', path='/', name='Dashboard', layout=dashboard_layout, order=0)
+register_page('map', path='/map', name='Map', layout=map_page_layout, order=1)
+register_page('scatter', path='/scatter', name='Scatter comparison', layout=scatter_page_layout, order=2)
+register_page('header', path='/header', name='Header only', layout=html.Div(), order=3)
+
+app.layout = html.Div(
+    id="root",
+    children=[
+
+        # Per-tab session state
+
+        # Small keys only (a country code, a comparison key), so request bodies stay small and any worker can answer:
+        # whatever is derived from them is rebuilt or looked up server side. Session storage keeps the selections
+        # across reloads of the tab.
+        # sessionId        drops superseded callback requests
+        # selectedCountry  code of the country last clicked on the map
+        # comparisonSet    comparison key of the line charts (see `comparison_locations`)
+        # selectedCountries  sorted codes of the countries picked for cross-filtering
+
+        dcc.Store(id='sessionId', storage_type='session'),
+        dcc.Store(id='selectedCountry', storage_type='session'),
+        dcc.Store(id='comparisonSet', storage_type='session'),
+        dcc.Store(id='selectedCountries', storage_type='session', data=[]),
+
+        # Header
+
+        html.Div(
+            id="header",
+            children=[
+                html.A(
+                    html.Img(id="logo", src=app.get_asset_url("dash-logo.png")),
+                    href="https://plotly.com/dash/",
+                ),
+                html.H4(children="A Comparative Analysis of Obesity & Lifestyle Factors In OECD Countries"),
+                html.P(
+                    id="description",
+                    children="Obesity has become a major public health concern in many countries. "
+                             "While several lifestyle factors have been identified as potential contributors to obesity, "
+                             "the relationship between obesity and these factors is not well understood.",
+                ),
+            ],
+        ),
+
+        # Page links
+
+        html.Div(
+            id="pageLinks",
+            children=[dcc.Link(page['name'], href=page['relative_path']) for page in page_registry.values()]
+        ),
+
+        page_container
+
+    ])
+
+# Callbacks may target components of any page, not only the one on screen
+app.validation_layout = html.Div([app.layout, dashboard_layout, map_page_layout, scatter_page_layout])
+
 
 #############################################################
 
 # Callbacks section#
 
+# Session id
+
+@callback(
+    Output(component_id='sessionId', component_property='data'),
+    Input(component_id='sessionId', component_property='modified_timestamp'),
+    State(component_id='sessionId', component_property='data')
+)
+@timed_callback('init_session_id')
+def init_session_id(modified_timestamp, session_id):
+    if session_id is not None:
+        return no_update
+    return new_session_id()
+
+
+# Choropleth map indicator and year
+
+@callback(
+    Output(component_id='map', component_property='figure'),
+    [
+        Input(component_id='mapDropdown', component_property='value'),
+        Input(component_id='mapYearSlider', component_property='value'),
+        Input(component_id='obesitySubject', component_property='value')
+    ],
+    State(component_id='sessionId', component_property='data'),
+    prevent_initial_call=True
+)
+@timed_callback('update_map')
+@coalesced('map')
+def update_map(chosen_indicator, chosen_year, obesity_subject):
+    return map_figure_patch(chosen_indicator, chosen_year, obesity_subject)
+
+
+def map_figure_patch(chosen_indicator, chosen_year, obesity_subject):
+    indicator = map_indicators[chosen_indicator]
+    row = obesity_subject_rows[obesity_subject] if chosen_indicator == 'Obesity' else indicator['index']
+
+    # Only the values and color range change; locations, geo layout and colorscale stay on the client
+    map_patch = Patch()
+    map_patch['data'][0]['z'] = typed_array_spec(map_panel[row, chosen_year - map_years[0]])
+    map_patch['data'][0]['zmax'] = indicator['zmax']
+    map_patch['data'][0]['colorbar']['title']['text'] = indicator['label']
+
+    return map_patch
+
+
+# Map page
+
+@callback(
+    Output(component_id='mapPageGraph', component_property='figure'),
+    [
+        Input(component_id='mapPageDropdown', component_property='value'),
+        Input(component_id='mapPageYearSlider', component_property='value')
+    ],
+    prevent_initial_call=True
+)
+@timed_callback('update_map_page')
+def update_map_page(chosen_indicator, chosen_year):
+    return map_figure_patch(chosen_indicator, chosen_year, 'PREFERRED')
+
+
 # Choropleth map click data
 
+# The browser reduces the map's clickData to the clicked country code; the server only ever sees the code
+app.clientside_callback(
+    """
+    function(clickData) {
+        if (!clickData) {
+            return window.dash_clientside.no_update;
+        }
+        return clickData.points[0].location;
+    }
+    """,
+    Output(component_id='selectedCountry', component_property='data'),
+    Input(component_id='map', component_property='clickData')
+)
+
+
 @app.callback(
     [
         Output(component_id='pie1', component_property='figure'),
@@ -433,44 +747,32 @@ app.layout = html.Div(
         Output(component_id='pie3', component_property='figure'),
         Output(component_id='pie4', component_property='figure'),
     ],
-    Input(component_id='map', component_property='clickData')
+    Input(component_id='selectedCountry', component_property='data')
 )
-def update_pies(click_data):
-    if click_data is not None:
-
+@timed_callback('update_pies')
+def update_pies(chosen_location):
+    if chosen_location:
+        # Countries without data for an indicator show 0, like before anything is clicked
         # Update dataset for obesity pie chart
-        filter_mask = obesity_sorted_by_value_df['LOCATION'] == click_data['points'][0]['location']
-        new_obesity_sorted_by_value_filtered_country_df = obesity_sorted_by_value_df[filter_mask]
-        new_obesity_value = new_obesity_sorted_by_value_filtered_country_df['Value'].to_string(index=False)
-        new_obesity_value = float(new_obesity_value)
+        new_obesity_value = indicator_store.latest_value('OVEROBESE', chosen_location) or 0
 
         new_obesity_percentage_df = pd.DataFrame({'names': ['progress', 'remaining'],
                                                   'values': [new_obesity_value / 100, (100 - new_obesity_value) / 100]})
 
         # Update dataset for alcohol pie chart
-        filter_mask = alcohol_sorted_by_value_df['LOCATION'] == click_data['points'][0]['location']
-        new_alcohol_sorted_by_value_filtered_country_df = alcohol_sorted_by_value_df[filter_mask]
-        new_alcohol_value = new_alcohol_sorted_by_value_filtered_country_df['Value'].to_string(index=False)
-        new_alcohol_value = float(new_alcohol_value)
+        new_alcohol_value = indicator_store.latest_value('ALCOHOL', chosen_location) or 0
 
         new_alcohol_percentage_df = pd.DataFrame({'names': ['progress', 'remaining'],
                                                   'values': [new_alcohol_value / 13, (13 - new_alcohol_value) / 13]})
 
         # Update dataset daily smoker pie chart
-        filter_mask = smoke_sorted_by_value_df['LOCATION'] == click_data['points'][0]['location']
-        new_smoke_sorted_by_value_filtered_country_df = smoke_sorted_by_value_df[filter_mask]
-        new_smoke_value = new_smoke_sorted_by_value_filtered_country_df['Value'].to_string(index=False)
-        new_smoke_value = float(new_smoke_value)
+        new_smoke_value = indicator_store.latest_value('SMOKERS', chosen_location) or 0
 
         new_smoke_percentage_df = pd.DataFrame({'names': ['progress', 'remaining'],
                                                 'values': [new_smoke_value / 100, (100 - new_smoke_value) / 100]})
 
         # Update dataset for social support pie chart
-        filter_mask = social_support_sorted_by_value_df['LOCATION'] == click_data['points'][0]['location']
-        new_social_support_sorted_by_value_filtered_country_df = social_support_sorted_by_value_df[filter_mask]
-        new_social_support_value = new_social_support_sorted_by_value_filtered_country_df['Value'].to_string(
-            index=False)
-        new_social_support_value = float(new_social_support_value)
+        new_social_support_value = indicator_store.latest_value('SOCSUPPORT', chosen_location) or 0
 
         new_social_support_percentage_df = pd.DataFrame({'names': ['progress', 'remaining'],
                                                          'values': [new_social_support_value / 100,
@@ -588,23 +890,23 @@ def update_pies(click_data):
 
 # Scatter plot
 
-@callback(
-    Output(component_id='scatterChart', component_property='figure'),
-    Input(component_id='scatterDropdown', component_property='value'),
-    prevent_initial_call=True
-)
-def update_scatter_plot(chosen_data):
+def scatter_figure(chosen_data, selected_countries=None):
+    # Shared by the dashboard's scatter plot, the scatter comparison page and the report export; each callback
+    # records its own metrics
+    # Anything else than alcohol or smokers (including a cleared dropdown) shows social support
+    if chosen_data not in scatter_indicator_codes:
+        chosen_data = 'Social Support'
 
     # Update scatter plot according to what user pick from the dropdown
     if chosen_data == 'Alcohol Consumption':
 
-        new_merged_df = pd.merge(obesity_sorted_by_value_df, alcohol_sorted_by_value_df, on='LOCATION')
-        new_merged_df = new_merged_df[['LOCATION', 'Value_x', 'Value_y']]
+        new_merged_df = indicator_store.latest_pair('OVEROBESE', 'ALCOHOL')
         new_merged_df = new_merged_df.rename(columns={'Value_x': 'Obesity_value', 'Value_y': 'Alcohol_value'})
 
         fig_scatter_plot = px.scatter(new_merged_df
                                       , x='Alcohol_value', y='Obesity_value'
-                                      , size='Obesity_value', title='Obese (% of population aged 15+) vs Alcohol Consumption (Litre/Capita, aged 15+)'
+                                      , size='Obesity_value', custom_data=['LOCATION']
+                                      , title='Obese (% of population aged 15+) vs Alcohol Consumption (Litre/Capita, aged 15+)'
                                       , color='Alcohol_value'
                                       , color_continuous_scale=['white', '#62fbd3', '#00ff85']
                                       , color_discrete_sequence=['#00ff85']
@@ -620,13 +922,12 @@ def update_scatter_plot(chosen_data):
 
     elif chosen_data == 'Daily Smokers':
 
-        new_merged_df = pd.merge(obesity_sorted_by_value_df, smoke_sorted_by_value_df, on='LOCATION')
-        new_merged_df = new_merged_df[['LOCATION', 'Value_x', 'Value_y']]
+        new_merged_df = indicator_store.latest_pair('OVEROBESE', 'SMOKERS')
         new_merged_df = new_merged_df.rename(columns={'Value_x': 'Obesity_value', 'Value_y': 'Smoke_value'})
 
         fig_scatter_plot = px.scatter(new_merged_df
                                       , x='Smoke_value', y='Obesity_value'
-                                      , size='Obesity_value'
+                                      , size='Obesity_value', custom_data=['LOCATION']
                                       , title='Obese (% of population aged 15+) vs Daily Smokers (% of population aged 15+)'
                                       , color='Smoke_value'
                                       , color_continuous_scale=['white', '#62fbd3', '#00ff85']
@@ -643,13 +944,12 @@ def update_scatter_plot(chosen_data):
 
     else:
 
-        new_merged_df = pd.merge(obesity_sorted_by_value_df, social_support_sorted_by_value_df, on='LOCATION')
-        new_merged_df = new_merged_df[['LOCATION', 'Value_x', 'Value_y']]
+        new_merged_df = indicator_store.latest_pair('OVEROBESE', 'SOCSUPPORT')
         new_merged_df = new_merged_df.rename(columns={'Value_x': 'Obesity_value', 'Value_y': 'Social_support_value'})
 
         fig_scatter_plot = px.scatter(new_merged_df
                                       , x='Social_support_value', y='Obesity_value'
-                                      , size='Obesity_value'
+                                      , size='Obesity_value', custom_data=['LOCATION']
                                       , title='Obese (% of population aged 15+) vs Social Support (% of population aged 15+)'
                                       , color='Social_support_value'
                                       , color_continuous_scale=['white', '#62fbd3', '#00ff85']
@@ -664,11 +964,171 @@ def update_scatter_plot(chosen_data):
             , paper_bgcolor='black'
             , font_color='#00ff85')
 
-    return fig_scatter_plot
+    fig_scatter_plot = fig_scatter_plot.update_traces(
+        selectedpoints=selected_indices(new_merged_df['LOCATION'], selected_countries), selector=0)
+
+    return add_trend_overlay(fig_scatter_plot, chosen_data)
+
+
+@callback(
+    Output(component_id='scatterChart', component_property='figure'),
+    Input(component_id='scatterDropdown', component_property='value'),
+    State(component_id='selectedCountries', component_property='data'),
+    prevent_initial_call=True
+)
+@timed_callback('update_scatter_plot')
+def update_scatter_plot(chosen_data, selected_countries=None):
+    return scatter_figure(chosen_data, selected_countries)
+
+
+# Scatter comparison page
+
+@callback(
+    Output(component_id='scatterPageChart1', component_property='figure'),
+    Input(component_id='scatterPageDropdown1', component_property='value')
+)
+@timed_callback('update_scatter_page1')
+def update_scatter_page1(chosen_data):
+    return scatter_figure(chosen_data)
+
+
+@callback(
+    Output(component_id='scatterPageChart2', component_property='figure'),
+    Input(component_id='scatterPageDropdown2', component_property='value')
+)
+@timed_callback('update_scatter_page2')
+def update_scatter_page2(chosen_data):
+    return scatter_figure(chosen_data)
+
+
+# Correlation matrix
+
+@callback(
+    Output(component_id='correlationMatrix', component_property='figure'),
+    [
+        Input(component_id='correlationMethod', component_property='value'),
+        Input(component_id='mapYearSlider', component_property='value')
+    ],
+    prevent_initial_call=True
+)
+@timed_callback('update_correlation_matrix')
+def update_correlation_matrix(chosen_method, chosen_year):
+    matrix_patch = Patch()
+    matrix_patch['data'][0]['z'] = indicator_statistics[chosen_method.lower()][:, :, chosen_year - map_years[0]]
+    matrix_patch['layout']['title']['text'] = '{} correlation between indicators ({})'.format(chosen_method,
+                                                                                                chosen_year)
+
+    return matrix_patch
+
+
+# Cross-filtering
+
+# Clicks on the map, a bar or a scatter point add or remove that country; a box or lasso selection on the bars or the
+# scatter plot replaces the selection. Worked out in the browser, so only the resulting country codes reach the server.
+app.clientside_callback(
+    """
+    function() {
+        const trigger = dash_clientside.callback_context.triggered[0];
+        if (!trigger || !trigger.value) {
+            return window.dash_clientside.no_update;
+        }
+
+        const [component, property] = trigger.prop_id.split('.');
+        const selected = new Set(arguments[arguments.length - 1] || []);
+        if (component === 'clearSelection') {
+            return [];
+        }
+
+        // Only the first trace of each chart holds countries; the scatter plot keeps its code in customdata
+        const countries = trigger.value.points
+            .filter(point => point.curveNumber === 0)
+            .map(point => point.location || (point.customdata && point.customdata[0]) || point.x);
+
+        if (property === 'selectedData') {
+            return Array.from(new Set(countries)).sort();
+        }
+        countries.forEach(country => selected.has(country) ? selected.delete(country) : selected.add(country));
+        return Array.from(selected).sort();
+    }
+    """,
+    Output(component_id='selectedCountries', component_property='data'),
+    [
+        Input(component_id='map', component_property='clickData'),
+        Input(component_id='barChart1', component_property='clickData'),
+        Input(component_id='barChart2', component_property='clickData'),
+        Input(component_id='barChart3', component_property='clickData'),
+        Input(component_id='barChart4', component_property='clickData'),
+        Input(component_id='barChart1', component_property='selectedData'),
+        Input(component_id='barChart2', component_property='selectedData'),
+        Input(component_id='barChart3', component_property='selectedData'),
+        Input(component_id='barChart4', component_property='selectedData'),
+        Input(component_id='scatterChart', component_property='clickData'),
+        Input(component_id='scatterChart', component_property='selectedData'),
+        Input(component_id='clearSelection', component_property='n_clicks')
+    ],
+    State(component_id='selectedCountries', component_property='data')
+)
+
+
+@callback(
+    [
+        Output(component_id='map', component_property='figure', allow_duplicate=True),
+        Output(component_id='barChart1', component_property='figure'),
+        Output(component_id='barChart2', component_property='figure'),
+        Output(component_id='barChart3', component_property='figure'),
+        Output(component_id='barChart4', component_property='figure'),
+        Output(component_id='scatterChart', component_property='figure', allow_duplicate=True)
+    ],
+    Input(component_id='selectedCountries', component_property='data'),
+    State(component_id='scatterDropdown', component_property='value'),
+    prevent_initial_call='initial_duplicate'
+)
+@timed_callback('update_highlights')
+def update_highlights(selected_countries, chosen_factor):
+    # Only `selectedpoints` of the first trace changes; values, colors and layouts stay on the client
+    patches = []
+    for locations in [map_locations] + bar_locations + [scatter_locations(chosen_factor)]:
+        patch = Patch()
+        patch['data'][0]['selectedpoints'] = selected_indices(locations, selected_countries)
+        patches.append(patch)
+
+    return patches
 
 
 # Line Chart
 
+# Sub-groups available for the chosen lifestyle factor; back to the total whenever the factor changes
+@callback(
+    [
+        Output(component_id='lineChartSubgroup', component_property='options'),
+        Output(component_id='lineChartSubgroup', component_property='value')
+    ],
+    Input(component_id='lineChartDropdown2', component_property='value'),
+    prevent_initial_call=True
+)
+@timed_callback('update_subgroup_options')
+def update_subgroup_options(chosen_life_factor):
+    return subject_options(chosen_life_factor), 'TOT'
+
+
+# The comparison dropdown and checkbox are folded into one comparison key in the browser
+app.clientside_callback(
+    """
+    function(countries, compareAll) {
+        if (compareAll && compareAll.length) {
+            return '*';
+        }
+        return Array.from(new Set(countries || [])).sort().join('.');
+    }
+    """,
+    Output(component_id='comparisonSet', component_property='data'),
+    [
+        Input(component_id='lineChartCompare', component_property='value'),
+        Input(component_id='lineChartCompareAll', component_property='value')
+    ]
+)
+
+
 @callback(
     [
         Output(component_id='lineChart1', component_property='figure'),
@@ -676,114 +1136,73 @@ def update_scatter_plot(chosen_data):
     ],
     [
         Input(component_id='lineChartDropdown1', component_property='value'),
-        Input(component_id='lineChartDropdown2', component_property='value')
-    ]
-
+        Input(component_id='lineChartDropdown2', component_property='value'),
+        Input(component_id='lineChartSubgroup', component_property='value'),
+        Input(component_id='comparisonSet', component_property='data'),
+        Input(component_id='selectedCountries', component_property='data'),
+        Input(component_id='obesitySubject', component_property='value')
+    ],
+    State(component_id='sessionId', component_property='data')
 )
-def update_scatter_plot(chosen_country, chosen_life_factor):
-    new_obesity_full_df = pd.read_csv("obesity_by_country_full.csv")
-    new_obesity_mean_full_df = new_obesity_full_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
-    filter_mask = new_obesity_mean_full_df['LOCATION'] == chosen_country
-    new_obesity_mean_full_filtered_df = new_obesity_mean_full_df[filter_mask]
-
-    fig_line_chart_1 = px.line(new_obesity_mean_full_filtered_df
-                               , x="TIME", y="Value"
-                               , title='Obese (% of population aged 15+)'
-                               , markers=True
-                               , labels={
-                                     "TIME": "Year",
-                                     "Value": "Population (%)"
-                                 })
-
-    fig_line_chart_1 = fig_line_chart_1.update_layout(
-        plot_bgcolor='black'
-        , paper_bgcolor='black'
-        , font_color='#00ff85')
+@timed_callback('update_line_charts')
+@coalesced('lineCharts')
+def update_line_charts(chosen_country, chosen_life_factor, subject, comparison_set, selected_countries,
+                       obesity_subject):
+    obesity_row = obesity_subject_rows[obesity_subject]
 
-    fig_line_chart_1 = fig_line_chart_1.update_traces(
-        line_color='#00ff85')
+    # Anything else than alcohol or smokers shows social support, like the dropdown always did
+    if chosen_life_factor not in line_chart_labels:
+        chosen_life_factor = 'Social Support'
 
-    # Update the dataset and line chart based on which value picked from dropdown
-    if chosen_life_factor == 'Alcohol Consumption':
+    # The sub-group is a row of the panel; a sub-group the factor does not have falls back to the total
+    subject_rows = factor_subject_rows.get(chosen_life_factor, {})
+    if subject not in subject_rows:
+        subject = 'TOT'
+    factor_row = subject_rows.get(subject, map_indicators[chosen_life_factor]['index'])
 
-        new_alcohol_full_df = pd.read_csv("alcohol_by_country_full.csv")
-        new_alcohol_mean_full_df = new_alcohol_full_df.groupby(['LOCATION', 'TIME'])['Value'].mean().reset_index()
-        filter_mask = new_alcohol_mean_full_df['LOCATION'] == chosen_country
-        new_alcohol_mean_full_filtered_df = new_alcohol_mean_full_df[filter_mask]
+    # Comparison mode overlays several countries: the ones chosen below the charts, else the cross-filter selection
+    comparison_set = comparison_set or '.'.join(selected_countries or [])
+    if comparison_set and comparison_locations(comparison_set, chosen_country):
+        return comparison_line_charts(obesity_row, chosen_life_factor, factor_row, subject, comparison_set,
+                                      chosen_country)
 
-        fig_line_chart_2 = px.line(new_alcohol_mean_full_filtered_df
-                                   , x="TIME", y="Value"
-                                   , title='Alcohol Consumption (lcpd, aged 15+)'
-                                   , markers=True
-                                   , labels={
-                                         "TIME": "Year",
-                                         "Value": "Litre/Capita"
-                                      })
+    return (single_line_chart('Obesity', obesity_row, chosen_country, '#00ff85'),
+            single_line_chart(chosen_life_factor, factor_row, chosen_country, 'red', subject))
 
-        fig_line_chart_2 = fig_line_chart_2.update_layout(
-            plot_bgcolor='black'
-            , paper_bgcolor='black'
-            , font_color='#00ff85')
 
-        fig_line_chart_2 = fig_line_chart_2.update_traces(
-            line_color='red')
-
-    elif chosen_life_factor == 'Daily Smokers':
-
-        smoke_full_df = pd.read_csv("smoke_by_country_full.csv")
-        filter_mask = smoke_full_df['SUBJECT'] == 'TOT'
-        smoke_full_df_filtered_by_subject = smoke_full_df[filter_mask]
-        smoke_mean_full_df = smoke_full_df_filtered_by_subject.groupby(['LOCATION', 'TIME'])[
-            'Value'].mean().reset_index()
-        filter_mask = smoke_mean_full_df['LOCATION'] == chosen_country
-        smoke_mean_full_filtered_by_country_df = smoke_mean_full_df[filter_mask]
-
-        fig_line_chart_2 = px.line(smoke_mean_full_filtered_by_country_df
-                                   , x="TIME", y="Value"
-                                   , title='Daily Smokers (% of population aged 15+)'
-                                   , markers=True
-                                   , labels={
-                                             "TIME": "Year",
-                                             "Value": "Population (%)"
-                                      })
-
-        fig_line_chart_2 = fig_line_chart_2.update_layout(
-            plot_bgcolor='black'
-            , paper_bgcolor='black'
-            , font_color='#00ff85')
+# Report export, health and readiness endpoints
 
-        fig_line_chart_2 = fig_line_chart_2.update_traces(
-            line_color='red')
+register_export_route(app.server)
+register_health_routes(app.server)
 
-    else:
 
-        social_support_full_df = pd.read_csv("socialsupport_by_country_full.csv")
-        filter_mask = social_support_full_df['SUBJECT'] == 'TOT'
-        social_support_full_df_filtered_by_subject = social_support_full_df[filter_mask]
-        social_support_mean_full_df = social_support_full_df_filtered_by_subject.groupby(['LOCATION', 'TIME'])[
-            'Value'].mean().reset_index()
-        filter_mask = social_support_mean_full_df['LOCATION'] == chosen_country
-        social_support_mean_full_filtered_by_country_df = social_support_mean_full_df[filter_mask]
-
-        fig_line_chart_2 = px.line(social_support_mean_full_filtered_by_country_df
-                                   , x="TIME", y="Value"
-                                   , title='Social Support (% of population aged 15+)'
-                                   , markers=True
-                                   , labels={
-                                         "TIME": "Year",
-                                         "Value": "Population (%)"
-                                     })
-
-        fig_line_chart_2 = fig_line_chart_2.update_layout(
-            plot_bgcolor='black'
-            , paper_bgcolor='black'
-            , font_color='#00ff85')
+def warm_up():
+    # Run every callback once so figure building, the store query caches and the bootstrap cache are warm before the
+    # first visitor; under gunicorn with preload_app this happens once, before the workers are forked
+    update_pies(None)
+    update_pies(country_list[0])
+    for factor in line_chart_labels:
+        if factor != 'Obesity':
+            update_scatter_plot(factor)
+            update_line_charts(country_list[0], factor, 'TOT', '', [], 'PREFERRED', None)
+    update_map('Obesity', map_years[-1], 'PREFERRED', None)
+    update_highlights(country_list[:2], 'Alcohol Consumption')
+    update_correlation_matrix('Pearson', map_years[-1])
+
+    # The initial scatter plot gets its trend overlay here rather than at import, so importing the app (e.g. in a
+    # spawned child, which re-imports it) never computes a bootstrap; the layout holds this same figure object
+    if not fig_scatterPlot.layout.annotations:
+        add_trend_overlay(fig_scatterPlot, 'Alcohol Consumption')
 
-        fig_line_chart_2 = fig_line_chart_2.update_traces(
-            line_color='red')
+    # Every bootstrap the app shows is cached now; under gunicorn the master's pool would only sit idle next to the
+    # workers
+    release_bootstrap_pool()
 
-    return fig_line_chart_1, fig_line_chart_2
+    # Those calls are not traffic; the workers forked from here must start /metrics at zero
+    reset_callback_metrics()
+    mark_done('warmup')
 
 
 if __name__ == '__main__':
+    warm_up()
     app.run(port=8005)
@@ -0,0 +1,343 @@
+import argparse
+import atexit
+import fcntl
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.io as pio
+
+from dashboard_data import country_list, location_index, map_indicators, obesity_subject_rows
+
+#############################################################
+
+# Report export section #
+
+# Renders every dashboard figure for a list of countries and lifestyle factors into a report bundle (a folder and a
+# zip of it). Rendering is spread over worker processes; each worker imports the dashboard once and keeps one kaleido
+# (headless Chrome) renderer warm for all its images instead of starting one per image. The data comes from
+# dashboard_data; only the figures need the app module.
+# Usable from the command line (`python report_export.py --help`) and from the `/export` endpoint of the app.
+# The endpoint never renders inside a web worker: it queues a job in EXPORT_DIR and starts one separate process for
+# it (`python report_export.py --job <folder>`). Jobs take a lock shared by every worker of the server, so only one
+# export renders at a time, with EXPORT_WORKERS render processes; the client polls `/export/<job>` for the bundle.
+
+FACTORS = ['Alcohol Consumption', 'Daily Smokers', 'Social Support']
+IMAGE_FORMATS = ['png', 'svg', 'pdf']
+# `json` writes the plotly figure itself and needs no renderer
+FORMATS = IMAGE_FORMATS + ['json']
+
+EXPORT_DIR = os.path.abspath(os.environ.get('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'obesity_reports')))
+# Render processes of a job started by /export (the command line defaults to one per core)
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 1))
+# A job still running after this long is failed and killed, so a hung renderer cannot hold the export lock forever
+EXPORT_TIMEOUT_SECONDS = int(os.environ.get('EXPORT_TIMEOUT_SECONDS', 900))
+# Extra time before a poll fails a job that outlived its timeout, which the job normally enforces itself
+EXPORT_TIMEOUT_GRACE_SECONDS = 60
+# Jobs older than this are deleted when the next one is queued
+EXPORT_RETENTION_SECONDS = 3600
+
+dashboard = None
+
+
+def _start_worker(formats):
+    global dashboard
+    import main as dashboard
+
+    if set(formats) & set(IMAGE_FORMATS):
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+        atexit.register(kaleido.stop_sync_server, silence_warnings=True)
+
+
+def _slug(name):
+    return name.lower().replace(' ', '_')
+
+
+def _job_figures(job):
+    kind, *args = job
+
+    if kind == 'overview':
+        return {
+            os.path.join('overview', 'barChart1'): dashboard.fig_barChart1,
+            os.path.join('overview', 'barChart2'): dashboard.fig_barChart2,
+            os.path.join('overview', 'barChart3'): dashboard.fig_barChart3,
+            os.path.join('overview', 'barChart4'): dashboard.fig_barChart4,
+            os.path.join('overview', 'map'): dashboard.fig_map,
+            os.path.join('overview', 'correlationMatrix'): dashboard.fig_correlationMatrix
+        }
+
+    if kind == 'scatter':
+        factor, = args
+        return {os.path.join('scatter', _slug(factor)): dashboard.scatter_figure(factor)}
+
+    # One job per country, so its obesity chart is built and rendered once rather than once per factor
+    country, factors = args
+    figures = {os.path.join('countries', country, 'obesity'): dashboard.single_line_chart(
+        'Obesity', obesity_subject_rows['PREFERRED'], country, '#00ff85')}
+    for factor in factors:
+        figures[os.path.join('countries', country, _slug(factor))] = dashboard.single_line_chart(
+            factor, map_indicators[factor]['index'], country, 'red')
+    return figures
+
+
+def _render_job(job, output_dir, formats):
+    figures = _job_figures(job)
+    written = []
+
+    for name in figures:
+        os.makedirs(os.path.join(output_dir, os.path.dirname(name)), exist_ok=True)
+
+    for file_format in formats:
+        files = [os.path.join(output_dir, name + '.' + file_format) for name in figures]
+        if file_format == 'json':
+            for fig, file in zip(figures.values(), files):
+                pio.write_json(fig, file)
+        else:
+            # One call per batch lets kaleido render the figures back to back in the warm browser
+            pio.write_images(list(figures.values()), files, format=file_format)
+        written.extend(files)
+
+    return written
+
+
+_pools = {}
+
+
+def _pool(workers, formats):
+    # Pools are kept until shutdown_pools() so repeated exports from one process reuse warm workers.
+    # Workers are spawned, not forked, so they never inherit the threads of a running server.
+    key = (workers, tuple(sorted(set(formats) & set(IMAGE_FORMATS))))
+    if key not in _pools:
+        _pools[key] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                          initializer=_start_worker, initargs=(formats,))
+    return _pools[key]
+
+
+def shutdown_pools():
+    """Stop the worker pools of this process; a process that exports once (the CLI, a job) calls it before exiting."""
+    while _pools:
+        _pools.popitem()[1].shutdown()
+
+
+def checked_request(countries=None, factors=None, formats=('png',)):
+    """Countries, factors and formats of a report with the defaults filled in; ValueError for unknown values.
+
+    ``countries`` defaults to every country of the line-chart dropdown and ``factors`` to every lifestyle factor.
+    """
+    formats = list(formats)
+    factors = list(factors or FACTORS)
+    countries = list(country_list if countries is None else countries)
+
+    # Country codes become folder names, so only known codes may reach os.path.join
+    for name, values, known in [('format', formats, FORMATS), ('factor', factors, FACTORS),
+                                ('country', countries, location_index)]:
+        unknown = [value for value in values if value not in known]
+        if unknown:
+            raise ValueError('Unknown report {}(s): {}'.format(name, ', '.join(map(str, unknown))))
+
+    return countries, factors, formats
+
+
+def export_report(output_dir, countries=None, factors=None, formats=('png',), workers=None, archive=True):
+    """Render the report bundle into ``output_dir`` and return the path of its zip (or of the folder)."""
+    countries, factors, formats = checked_request(countries, factors, formats)
+
+    jobs = ([('overview',)]
+            + [('scatter', factor) for factor in factors]
+            + [('country', country, factors) for country in countries])
+
+    os.makedirs(output_dir, exist_ok=True)
+    pool = _pool(workers or os.cpu_count(), formats)
+    list(pool.map(_render_job, jobs, [output_dir] * len(jobs), [formats] * len(jobs)))
+
+    if not archive:
+        return output_dir
+    return shutil.make_archive(output_dir, 'zip', output_dir)
+
+
+#############################################################
+
+# Export jobs section #
+
+_JOB_ID = re.compile('^[0-9a-f]{32}$')
+
+
+def _write_status(job_dir, **status):
+    # Write then rename, so a worker polling the job never reads half a file
+    with open(os.path.join(job_dir, 'status.tmp'), 'w') as file:
+        json.dump(status, file)
+    os.replace(os.path.join(job_dir, 'status.tmp'), os.path.join(job_dir, 'status.json'))
+
+
+def _read_status(job_dir):
+    with open(os.path.join(job_dir, 'status.json')) as file:
+        return json.load(file)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def job_status(job_dir):
+    """Status of a job. A queued or running job whose process is gone, or that is running past its timeout, is
+    recorded as failed, so a job that died without saying so does not stay queued forever."""
+    status = _read_status(job_dir)
+    if status['state'] not in ('queued', 'running'):
+        return status
+
+    # The job records its pid once it runs; before that, the pid written by the worker that started it
+    if 'pid' not in status:
+        with open(os.path.join(job_dir, 'job.pid')) as file:
+            status['pid'] = int(file.read())
+
+    if not _is_alive(status['pid']):
+        # The process may have finished between the two reads; a dead process writes no more, so this one is final
+        status = _read_status(job_dir)
+        if status['state'] in ('queued', 'running'):
+            status = dict(status, state='failed', error='The export job process exited without finishing')
+            _write_status(job_dir, **status)
+    elif (status['state'] == 'running'
+          and time.time() - status['started'] > EXPORT_TIMEOUT_SECONDS + EXPORT_TIMEOUT_GRACE_SECONDS):
+        # The job leads its own process group (see queue_job)
+        os.killpg(status['pid'], signal.SIGKILL)
+        status = dict(status, state='failed', error='Export took longer than {}s'.format(EXPORT_TIMEOUT_SECONDS))
+        _write_status(job_dir, **status)
+
+    return status
+
+
+def _remove_old_jobs():
+    for name in os.listdir(EXPORT_DIR):
+        job_dir = os.path.join(EXPORT_DIR, name)
+        if _JOB_ID.match(name) and time.time() - os.path.getmtime(job_dir) > EXPORT_RETENTION_SECONDS:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def queue_job(countries=None, factors=None, formats=('png',)):
+    """Check the request, start its job process and return the job id; ValueError for unknown values."""
+    countries, factors, formats = checked_request(countries, factors, formats)
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _remove_old_jobs()
+
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(EXPORT_DIR, job_id)
+    os.makedirs(job_dir)
+    with open(os.path.join(job_dir, 'request.json'), 'w') as file:
+        json.dump({'countries': countries, 'factors': factors, 'formats': formats}, file)
+    _write_status(job_dir, state='queued', queued=time.time())
+
+    with open(os.path.join(job_dir, 'job.log'), 'w') as log:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--job', job_dir],
+                                   stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    with open(os.path.join(job_dir, 'job.pid'), 'w') as file:
+        file.write(str(process.pid))
+
+    # Reap the process as soon as it exits; a zombie would still look alive to the workers polling the job
+    threading.Thread(target=process.wait, daemon=True).start()
+    return job_id
+
+
+def run_job(job_dir):
+    """Body of a job process: wait for the export lock, render the requested report and record the outcome."""
+    with open(os.path.join(job_dir, 'request.json')) as file:
+        request = json.load(file)
+
+    with open(os.path.join(EXPORT_DIR, 'export.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _write_status(job_dir, state='running', pid=os.getpid(), started=time.time())
+
+        def timed_out(signum, frame):
+            _write_status(job_dir, state='failed', error='Export took longer than {}s'.format(EXPORT_TIMEOUT_SECONDS))
+            # The job leads its own session (see queue_job), so this also stops its render processes and browsers
+            os.killpg(0, signal.SIGKILL)
+
+        signal.signal(signal.SIGALRM, timed_out)
+        signal.alarm(EXPORT_TIMEOUT_SECONDS)
+        try:
+            bundle = export_report(os.path.join(job_dir, 'report'), workers=EXPORT_WORKERS, **request)
+        except Exception as error:
+            _write_status(job_dir, state='failed', error=repr(error))
+            raise
+        finally:
+            shutdown_pools()
+        _write_status(job_dir, state='done', bundle=bundle)
+
+
+def register_export_route(server):
+    """Add the export endpoints to the Flask server of the app.
+
+    ``/export?countries=FRA,DEU&factors=Daily Smokers&formats=png,svg`` queues a report and answers 202 with the job;
+    ``/export/<job>`` answers 202 while it is queued or running and the zip once it is done.
+    """
+    from flask import jsonify, request, send_file, url_for
+
+    @server.route('/export')
+    def export():
+        def listed(name):
+            value = request.args.get(name)
+            return [item.strip() for item in value.split(',') if item.strip()] if value else None
+
+        try:
+            job_id = queue_job(listed('countries'), listed('factors'), listed('formats') or ['png'])
+        except ValueError as error:
+            return str(error), 400
+
+        status_url = url_for('export_job', job_id=job_id)
+        return jsonify(job=job_id, state='queued', status=status_url), 202, {'Location': status_url}
+
+    @server.route('/export/<job_id>')
+    def export_job(job_id):
+        job_dir = os.path.join(EXPORT_DIR, job_id)
+        if not _JOB_ID.match(job_id) or not os.path.isdir(job_dir):
+            return 'Unknown export job', 404
+
+        status = job_status(job_dir)
+        if status['state'] == 'failed':
+            return jsonify(job=job_id, **status), 500
+        if status['state'] != 'done':
+            return jsonify(job=job_id, **status), 202
+        return send_file(status['bundle'], mimetype='application/zip', as_attachment=True,
+                         download_name='obesity_report.zip')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every dashboard figure into a report bundle.')
+    parser.add_argument('--output', default=os.path.join('reports', time.strftime('%Y-%m-%d')),
+                        help='folder of the bundle; a zip with the same name is written next to it')
+    parser.add_argument('--countries', nargs='*', help='country codes (default: every country)')
+    parser.add_argument('--factors', nargs='*', choices=FACTORS, help='lifestyle factors (default: all)')
+    parser.add_argument('--formats', nargs='*', choices=FORMATS, default=['png'])
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--no-archive', action='store_true', help='only write the folder, no zip')
+    parser.add_argument('--job', metavar='FOLDER', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.job:
+        run_job(options.job)
+        sys.exit()
+
+    started = time.perf_counter()
+    try:
+        bundle = export_report(options.output, options.countries, options.factors, options.formats, options.workers,
+                               archive=not options.no_archive)
+    finally:
+        shutdown_pools()
+    print('Report written to {} in {:.1f}s'.format(bundle, time.perf_counter() - started))
@@ -0,0 +1,148 @@
+import itertools
+import os
+import threading
+import uuid
+from functools import wraps
+
+from dash.exceptions import PreventUpdate
+
+#############################################################
+
+# Request coalescing section #
+
+# Dash fires one request per dropdown change, so scrolling through a dropdown with the keyboard queues a burst of
+# callbacks where only the last one matters. Two mechanisms keep that burst cheap:
+#   - latest-only with debounce: every request registers a generation for its (session, output) and waits
+#     DEBOUNCE_SECONDS before computing; a newer request for the same pair during that window (or during the
+#     computation) makes the older one answer with PreventUpdate, so a burst only computes its last request
+#   - single-flight: identical requests running at the same time (same output, same arguments, any session) share
+#     one computation instead of each doing it
+# Both are per process. Under gunicorn, requests of one session that land on different workers are not coalesced
+# with each other; each worker only sees its own share of the burst.
+
+# Quiet period before a request starts computing; COALESCE_DEBOUNCE_MS overrides it (0 disables the debounce)
+DEBOUNCE_SECONDS = float(os.environ.get('COALESCE_DEBOUNCE_MS', 60)) / 1000
+
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the same key wait for and share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            call['done'].wait()
+        else:
+            try:
+                call['result'] = fn()
+            except BaseException as error:
+                call['error'] = error
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+
+class LatestOnly:
+    """Tracks the newest request per (session, output) so superseded requests can be dropped."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (session, output) -> (generation, event set when a newer request supersedes it)
+        self._generations = {}
+        # Generations come from one global counter so a forgotten key never hands out a number still in use
+        self._counter = itertools.count(1)
+
+    def begin(self, session_id, output_key):
+        with self._lock:
+            generation = next(self._counter)
+            previous = self._generations.get((session_id, output_key))
+            self._generations[(session_id, output_key)] = (generation, threading.Event())
+        if previous is not None:
+            # Wake the superseded request if it is still in its debounce window
+            previous[1].set()
+        return generation
+
+    def is_current(self, session_id, output_key, generation):
+        current = self._generations.get((session_id, output_key))
+        return current is not None and current[0] == generation
+
+    def wait_superseded(self, session_id, output_key, generation, timeout):
+        """Wait up to ``timeout`` seconds; True as soon as a newer request for the same pair has begun."""
+        current = self._generations.get((session_id, output_key))
+        if current is None or current[0] != generation:
+            return True
+        return current[1].wait(timeout)
+
+    def end(self, session_id, output_key, generation):
+        # Forget the session once its newest request has finished so the table does not grow with every visitor
+        with self._lock:
+            if self.is_current(session_id, output_key, generation):
+                del self._generations[(session_id, output_key)]
+
+
+single_flight = SingleFlight()
+latest_only = LatestOnly()
+
+
+def _freeze(value):
+    # Callback arguments can be lists or dicts (multi-select dropdowns, store data); make them usable as a key
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def coalesced(output_key, debounce=None):
+    """Decorator for a Dash callback whose last argument is the session id (``State('sessionId', 'data')``).
+
+    ``debounce`` defaults to DEBOUNCE_SECONDS. Requests without a session id (e.g. the initial call before the session
+    store is filled) are only deduplicated, never delayed or dropped.
+    """
+    debounce = DEBOUNCE_SECONDS if debounce is None else debounce
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args):
+            *args, session_id = args
+            args = tuple(args)
+            key = (output_key, _freeze(args))
+
+            if session_id is None:
+                return single_flight.do(key, lambda: func(*args))
+
+            generation = latest_only.begin(session_id, output_key)
+            try:
+                # Hold the request for the debounce window and skip the work entirely if a newer one arrives in it
+                if latest_only.wait_superseded(session_id, output_key, generation, debounce):
+                    raise PreventUpdate
+
+                result = single_flight.do(key, lambda: func(*args))
+
+                # Drop the result if it was superseded while computing; the newer request will deliver its own
+                if not latest_only.is_current(session_id, output_key, generation):
+                    raise PreventUpdate
+                return result
+            finally:
+                latest_only.end(session_id, output_key, generation)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,17 @@
+import main
+
+#############################################################
+
+# WSGI entry point #
+
+# Production servers load the dashboard through `create_app`, e.g. `gunicorn -c gunicorn.conf.py`. Loading the module
+# reads and aggregates every dataset and warms the figures, so with `preload_app` this runs once in the gunicorn master
+# and the workers share the result copy-on-write. `python main.py` still starts the development server.
+
+
+def create_app():
+    main.warm_up()
+    return main.app.server
+
+
+application = create_app()